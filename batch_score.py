@@ -0,0 +1,175 @@
+"""
+Batch scoring of survey exports.
+
+Scores every respondent of a survey export (same column layout as final.csv)
+for Y1 and Y2 with one of the trained models. The export is streamed in
+fixed-size chunks and each chunk is encoded and scored with a single
+vectorized predict call per target, then appended to the output file, so the
+whole export never has to fit in memory.
+
+Usage:
+    python batch_score.py survey.csv predictions.csv --model "Random Forest Classifier"
+    python batch_score.py survey.parquet predictions.parquet --proba --chunksize 100000
+    python batch_score.py survey.csv predictions.csv --model "Decision Tree" --multi-output
+    python batch_score.py survey.csv predictions.csv --cascade "Logistic Regression" "Support Vector Machine"
+"""
+import argparse
+import os
+
+import pandas as pd
+
+from cascade import DEFAULT_THRESHOLD
+from feature_encoder import ENCODER
+from model_registry import MODEL_FILES, TARGETS, get_registry
+
+DEFAULT_CHUNKSIZE = 50_000
+
+
+def _is_parquet(path):
+    return os.path.splitext(path)[1].lower() in (".parquet", ".pq")
+
+
+def iter_chunks(path, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Yield the rows of a CSV or Parquet export as DataFrames of at most
+    `chunksize` rows.
+    """
+    if _is_parquet(path):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize)
+
+
+def _predict_targets(models, features, proba):
+    # Yields (target, predictions, classes, probabilities) for Y1 and Y2
+    if isinstance(models, tuple):
+        for target, model in zip(TARGETS, models):
+            yield target, model.predict(features), model.classes_, model.predict_proba(features) if proba else None
+    else:
+        predictions = models.predict(features)
+        probabilities = models.predict_proba(features) if proba else [None] * len(TARGETS)
+        for index, target in enumerate(TARGETS):
+            yield target, predictions[:, index], models.classes_[index], probabilities[index]
+
+
+def score_frame(frame, models, proba=False, id_column=None):
+    """
+    Score one chunk of the export.
+
+    Parameters:
+    - frame (DataFrame): Rows of the export.
+    - models: The (Y1, Y2) pair of fitted models, or one multi-output model
+      predicting both targets.
+    - proba (bool): Also return the class probabilities of each target.
+    - id_column (str): Column copied from the input to identify each row.
+
+    Returns a DataFrame with one row per input row.
+    """
+    features = ENCODER.encode(frame)
+    result = pd.DataFrame(index=frame.index)
+    if id_column is not None:
+        result[id_column] = frame[id_column].to_numpy()
+
+    for target, predictions, classes, probabilities in _predict_targets(models, features, proba):
+        result[f"prediction_{target}"] = predictions
+        if proba:
+            for index, label in enumerate(classes):
+                result[f"proba_{target}_{label}"] = probabilities[:, index]
+    return result
+
+
+class _ResultWriter:
+    """Appends scored chunks to a CSV or Parquet file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._parquet_writer = None
+        self._header_written = False
+
+    def write(self, result):
+        if _is_parquet(self.path):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(result, preserve_index=False)
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(self.path, table.schema)
+            self._parquet_writer.write_table(table)
+        else:
+            result.to_csv(self.path, mode="a" if self._header_written else "w",
+                          header=not self._header_written, index=False)
+            self._header_written = True
+
+    def close(self):
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+
+
+def score_file(input_path, output_path, model_choice="Logistic Regression", chunksize=DEFAULT_CHUNKSIZE,
+               proba=False, id_column=None, multi_output=False):
+    """
+    Score a whole survey export chunk by chunk and write the predictions.
+
+    Parameters:
+    - input_path (str): CSV or Parquet export with the final.csv column layout.
+    - output_path (str): CSV or Parquet file receiving the predictions.
+    - model_choice (str): Model name as shown in the app, or the name of a
+      cascade registered with the registry.
+    - chunksize (int): Rows read, scored and written at a time.
+    - proba (bool): Also write the class probabilities of each target.
+    - id_column (str): Input column copied to the output to identify rows.
+    - multi_output (bool): Score with the model trained by
+      `run.py --multi-output`, one predict call for both targets.
+
+    Returns the number of rows scored.
+    """
+    models = get_registry().get_models(model_choice, multi_output)
+    writer = _ResultWriter(output_path)
+    rows = 0
+    try:
+        for chunk in iter_chunks(input_path, chunksize):
+            writer.write(score_frame(chunk, models, proba=proba, id_column=id_column))
+            rows += len(chunk)
+    finally:
+        writer.close()
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a survey export for Y1 and Y2.")
+    parser.add_argument("input", help="CSV or Parquet export with the same columns as final.csv")
+    parser.add_argument("output", help="CSV or Parquet file to write the predictions to")
+    parser.add_argument("--model", default="Logistic Regression", choices=list(MODEL_FILES),
+                        help="model used for scoring (default: %(default)s)")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE,
+                        help="rows scored per chunk (default: %(default)s)")
+    parser.add_argument("--proba", action="store_true", help="also write class probabilities")
+    parser.add_argument("--id-column", help="input column copied to the output to identify rows")
+    parser.add_argument("--multi-output", action="store_true",
+                        help="use the multi-output model trained by run.py --multi-output")
+    parser.add_argument("--cascade", nargs=2, metavar=("CHEAP", "EXPENSIVE"),
+                        help="score with the cascade of these two models instead of --model")
+    parser.add_argument("--cascade-threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="cheap model confidence from which the cascade does not escalate (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    model_choice = args.model
+    if args.cascade:
+        if args.multi_output:
+            parser.error("cascades are built from the two-target models")
+        if not set(args.cascade) <= set(MODEL_FILES):
+            parser.error(f"--cascade takes two of: {', '.join(MODEL_FILES)}")
+        model_choice = get_registry().register_cascade(*args.cascade, args.cascade_threshold)
+
+    rows = score_file(args.input, args.output, model_choice=model_choice, chunksize=args.chunksize,
+                      proba=args.proba, id_column=args.id_column, multi_output=args.multi_output)
+    print(f"Scored {rows} rows with {model_choice} into {args.output}")
+    for row in get_registry().cascade_stats():
+        print(f"{row['target']}: escalated {row['escalated']} of {row['rows']} rows ({row['escalation_rate']:.1%})")
+
+
+if __name__ == "__main__":
+    main()
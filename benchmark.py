@@ -0,0 +1,320 @@
+"""
+Inference benchmark of the shipped Y1/Y2 models.
+
+For each model family and target, in a fresh process so that load time and
+memory are not skewed by the models benchmarked before it, this measures:
+
+- load_seconds: time to load the model through the registry, including the
+  import of its library,
+- latency_ms: single-row predict latency percentiles (p50/p95/p99) over rows
+  sampled from final.csv,
+- throughput: rows scored per second at each batch size,
+- library_throughput: the same for the pickled original, when the model is
+  served from a compact artifact,
+- peak_memory_bytes: growth of the peak resident memory from just before the
+  model is loaded to the end of the run.
+
+Results are written as JSON. Passing a previous result file with --compare
+prints the change of every metric and exits with status 1 when a latency or
+throughput metric regressed beyond --tolerance, so runs before and after a
+retraining can be compared. Every run also exits with status 1 when a model
+served from a compact artifact is slower than its pickle at some batch size
+by more than --library-tolerance.
+
+Usage:
+    python benchmark.py --output bench.json
+    python benchmark.py --models decision_tree xgboost --batch-sizes 1 100 10000
+    python benchmark.py --output new.json --compare bench.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from environment import library_versions
+from model_registry import MODEL_DIR, MODEL_FILES, TARGETS, model_path
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "final.csv")
+
+BATCH_SIZES = (1, 10, 100, 1_000, 10_000, 100_000)
+
+# Model prefixes (as used by run.py) mapped back to the names shown in the app
+FAMILIES = {prefix: model_choice for model_choice, prefix in MODEL_FILES.items()}
+
+
+def sample_rows(data_path, rows, seed=0):
+    """
+    Return `rows` encoded rows sampled with replacement from `data_path`.
+
+    Parameters:
+    - data_path (str): CSV with the survey answers, e.g. final.csv.
+    - rows (int): Number of rows to sample.
+    - seed (int): Seed of the sampling.
+    """
+    import numpy as np
+
+    from dataset import load_dataset
+    from feature_encoder import ENCODER
+
+    features = ENCODER.encode(load_dataset(data_path))
+    indices = np.random.default_rng(seed).integers(0, len(features), rows)
+    return np.ascontiguousarray(features[indices])
+
+
+def _peak_rss_bytes():
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _percentiles(samples):
+    import numpy as np
+
+    milliseconds = np.asarray(samples) * 1000
+    return {
+        "p50": float(np.percentile(milliseconds, 50)),
+        "p95": float(np.percentile(milliseconds, 95)),
+        "p99": float(np.percentile(milliseconds, 99)),
+        "mean": float(milliseconds.mean()),
+    }
+
+
+def benchmark_model(family, target, data_path=DATA_PATH, model_dir=MODEL_DIR, prefer_compact=True,
+                    batch_sizes=BATCH_SIZES, latency_samples=500, min_seconds=0.5, seed=0):
+    """
+    Benchmark one model. Meant to run in a process of its own.
+
+    Parameters:
+    - family (str): Model prefix, e.g. "decision_tree".
+    - target (str): "y1" or "y2".
+    - data_path (str): CSV the benchmark rows are sampled from.
+    - model_dir (str): Directory holding the models.
+    - prefer_compact (bool): Load compact artifacts when they are up to date.
+    - batch_sizes (tuple): Batch sizes the throughput is measured at.
+    - latency_samples (int): Single-row predictions timed for the percentiles.
+    - min_seconds (float): Minimum time spent measuring each batch size.
+    - seed (int): Seed of the row sampling.
+
+    Returns a dict with the measurements.
+    """
+    from model_registry import ModelRegistry
+
+    rows = sample_rows(data_path, max(max(batch_sizes), latency_samples), seed)
+    registry = ModelRegistry(model_dir, prefer_compact)
+    memory_before = _peak_rss_bytes()
+    start = time.perf_counter()
+    model = registry.get(FAMILIES[family], target)
+    load_seconds = time.perf_counter() - start
+    source = registry.stats()[0]["path"]
+
+    # Warm up caches and lazily initialised state before timing
+    for index in range(10):
+        model.predict(rows[index:index + 1])
+
+    samples = []
+    for index in range(latency_samples):
+        row = rows[index:index + 1]
+        start = time.perf_counter()
+        model.predict(row)
+        samples.append(time.perf_counter() - start)
+
+    result = {
+        "model": family,
+        "target": target,
+        "source": os.path.relpath(source, model_dir),
+        "load_seconds": load_seconds,
+        "latency_ms": _percentiles(samples),
+        "throughput": _throughput(model, rows, batch_sizes, min_seconds),
+        "peak_memory_bytes": max(0, _peak_rss_bytes() - memory_before),
+    }
+    if os.path.isdir(source):
+        import joblib
+
+        try:
+            original = joblib.load(model_path(FAMILIES[family], target, model_dir))
+        except FileNotFoundError:
+            pass
+        else:
+            result["library_throughput"] = _throughput(original, rows, batch_sizes, min_seconds)
+    return result
+
+
+def _throughput(model, rows, batch_sizes, min_seconds):
+    # Rows scored per second by `model` at each batch size
+    throughput = {}
+    for batch_size in batch_sizes:
+        batch = rows[:batch_size]
+        # Warm up first, as a served model may load its pickle for large batches
+        model.predict(batch)
+        scored, elapsed = 0, 0.0
+        while elapsed < min_seconds or scored == 0:
+            start = time.perf_counter()
+            model.predict(batch)
+            elapsed += time.perf_counter() - start
+            scored += batch_size
+        throughput[str(batch_size)] = scored / elapsed
+    return throughput
+
+
+def slower_than_library(report, tolerance=0.25):
+    """
+    Return the (model, target, batch size, ratio) of every batch size at which
+    a model served from a compact artifact scores fewer rows per second than
+    its pickle by more than `tolerance`, ratio being compact / pickle.
+    """
+    slower = []
+    for result in report["results"]:
+        for size, library in result.get("library_throughput", {}).items():
+            ratio = result["throughput"][size] / library
+            if ratio < 1 - tolerance:
+                slower.append((result["model"], result["target"], int(size), ratio))
+    return slower
+
+
+def run_benchmark(families, targets, **options):
+    """
+    Benchmark every (family, target) pair, each in a freshly spawned process.
+
+    Returns the JSON-ready report; models missing from disk are listed with
+    an "error" instead of measurements.
+    """
+    results = []
+    for family in families:
+        for target in targets:
+            # A new process per model so load time and peak memory are its own
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+                try:
+                    result = pool.submit(benchmark_model, family, target, **options).result()
+                except FileNotFoundError as error:
+                    result = {"model": family, "target": target, "error": f"{error.filename} is missing"}
+            results.append(result)
+            print(_format_result(result), flush=True)
+    return {
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "libraries": library_versions(),
+        },
+        "options": {name: list(value) if isinstance(value, tuple) else value for name, value in options.items()},
+        "results": results,
+    }
+
+
+def _format_result(result):
+    if "error" in result:
+        return f"{result['model']:<16}{result['target']:<8}{result['error']}"
+    latency = result["latency_ms"]
+    throughput = ", ".join(f"{size}: {rate:,.0f}/s" for size, rate in result["throughput"].items())
+    if "library_throughput" in result:
+        library = ", ".join(f"{size}: {rate:,.0f}/s" for size, rate in result["library_throughput"].items())
+        throughput = f"{throughput}] [pickle {library}"
+    return (f"{result['model']:<16}{result['target']:<8}load {result['load_seconds'] * 1000:8.1f} ms  "
+            f"p50 {latency['p50']:7.3f} ms  p95 {latency['p95']:7.3f} ms  p99 {latency['p99']:7.3f} ms  "
+            f"peak {result['peak_memory_bytes'] / 2**20:7.1f} MB  [{throughput}]")
+
+
+def _metrics(result):
+    # Flattens one result into {metric: (value, higher_is_better)}
+    metrics = {
+        "load_seconds": (result["load_seconds"], False),
+        "peak_memory_bytes": (result["peak_memory_bytes"], False),
+    }
+    for name, value in result["latency_ms"].items():
+        metrics[f"latency_ms.{name}"] = (value, False)
+    for size, value in result["throughput"].items():
+        metrics[f"throughput.{size}"] = (value, True)
+    return metrics
+
+
+def compare(previous, current, tolerance=0.1):
+    """
+    Print how every metric changed between two reports.
+
+    Parameters:
+    - previous (dict): Report of the baseline run.
+    - current (dict): Report of the new run.
+    - tolerance (float): Relative change of a latency or throughput metric
+      counted as a regression.
+
+    Returns the list of (model, target, metric, change) regressions.
+    """
+    baseline = {(result["model"], result["target"]): result for result in previous["results"] if "error" not in result}
+    regressions = []
+    print(f"\n{'model':<16}{'target':<8}{'metric':<22}{'before':>14}{'after':>14}{'change':>9}")
+    for result in current["results"]:
+        old = baseline.get((result["model"], result["target"]))
+        if old is None or "error" in result:
+            continue
+        old_metrics = _metrics(old)
+        for metric, (value, higher_is_better) in _metrics(result).items():
+            if metric not in old_metrics or not old_metrics[metric][0]:
+                continue
+            before = old_metrics[metric][0]
+            change = (value - before) / before
+            worse = -change if higher_is_better else change
+            # Load time and memory vary with the machine's state, so they are
+            # reported but do not fail the comparison
+            flag = ""
+            if worse > tolerance and metric.startswith(("latency", "throughput")):
+                regressions.append((result["model"], result["target"], metric, change))
+                flag = "  REGRESSION"
+            print(f"{result['model']:<16}{result['target']:<8}{metric:<22}{before:>14.4g}{value:>14.4g}"
+                  f"{change:>+9.1%}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark inference of the Y1/Y2 models.")
+    parser.add_argument("--models", nargs="+", choices=list(FAMILIES), default=list(FAMILIES),
+                        help="model families to benchmark (default: all)")
+    parser.add_argument("--targets", nargs="+", choices=TARGETS, default=list(TARGETS))
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=list(BATCH_SIZES))
+    parser.add_argument("--latency-samples", type=int, default=500, help="single-row predictions timed per model")
+    parser.add_argument("--min-seconds", type=float, default=0.5, help="minimum time spent per batch size")
+    parser.add_argument("--data", default=DATA_PATH, help="CSV the rows are sampled from (default: final.csv)")
+    parser.add_argument("--model-dir", default=MODEL_DIR, help="directory holding the models")
+    parser.add_argument("--pickle", dest="prefer_compact", action="store_false",
+                        help="benchmark the pickles even when compact artifacts are up to date")
+    parser.add_argument("--library-tolerance", type=float, default=0.25,
+                        help="relative throughput deficit of a compact model against its pickle counted as "
+                             "slower (default: 0.25)")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--compare", help="previous JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="relative latency/throughput change counted as a regression (default: 0.1)")
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(args.models, args.targets, data_path=args.data, model_dir=args.model_dir,
+                           prefer_compact=args.prefer_compact, batch_sizes=tuple(args.batch_sizes),
+                           latency_samples=args.latency_samples, min_seconds=args.min_seconds)
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+    failed = False
+    slower = slower_than_library(report, args.library_tolerance)
+    for family, target, batch_size, ratio in slower:
+        print(f"{family:<16}{target:<8}batch {batch_size}: compact at {ratio:.0%} of the pickle's throughput")
+    if slower:
+        print(f"\n{len(slower)} batch size(s) slower than the pickle by more than {args.library_tolerance:.0%}")
+        failed = True
+    if args.compare:
+        with open(args.compare) as previous:
+            regressions = compare(json.load(previous), report, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} metric(s) regressed by more than {args.tolerance:.0%}")
+            failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
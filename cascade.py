@@ -0,0 +1,168 @@
+"""
+Cascade of a cheap model in front of an expensive one.
+
+A `CascadeModel` scores every row with the cheap model first. Rows whose
+highest class probability reaches the threshold keep the cheap model's
+answer; only the remaining, low-confidence rows are forwarded to the
+expensive model. The cascade has the predict/predict_proba/classes_ interface
+of the models it wraps, so the registry (ModelRegistry.register_cascade), the
+HTTP service and batch scoring serve it like any other model, and it counts
+how many rows it escalated.
+
+Run as a script, it measures on the run.py test split, for each threshold,
+the escalation rate, the accuracy of the cascade against the expensive model
+alone, and the CPU time both spend scoring the split.
+
+Usage:
+    python cascade.py --cheap "Logistic Regression" --expensive "Support Vector Machine"
+    python cascade.py --cheap "Decision Tree" --expensive "Random Forest Classifier" --thresholds 0.8 0.9 0.99
+"""
+import argparse
+import threading
+import time
+
+import numpy as np
+
+DEFAULT_THRESHOLD = 0.9
+
+
+def cascade_name(cheap, expensive):
+    """Return the model name a cascade is served under."""
+    return f"Cascade: {cheap} -> {expensive}"
+
+
+class CascadeModel:
+    """
+    Answers with `cheap` when it is confident, with `expensive` otherwise.
+
+    Parameters:
+    - cheap: Fitted model with predict_proba, evaluated on every row.
+    - expensive: Fitted model evaluated on the low-confidence rows only.
+    - threshold (float): Highest class probability from which the cheap
+      model's answer is kept.
+    """
+
+    def __init__(self, cheap, expensive, threshold=DEFAULT_THRESHOLD):
+        if not np.array_equal(cheap.classes_, expensive.classes_):
+            raise ValueError("The models of a cascade must predict the same classes")
+        self.cheap = cheap
+        self.expensive = expensive
+        self.threshold = threshold
+        self.classes_ = cheap.classes_
+        self.rows = 0
+        self.escalated = 0
+        self._lock = threading.Lock()
+
+    def _route(self, input_data, count=True):
+        # Returns the cheap model's probabilities and the mask of the rows to escalate
+        # Copied, as the escalated rows are overwritten by predict_proba
+        proba = np.array(self.cheap.predict_proba(input_data), dtype=np.float64)
+        escalate = proba.max(axis=1) < self.threshold
+        if count:
+            with self._lock:
+                self.rows += len(proba)
+                self.escalated += int(escalate.sum())
+        return proba, escalate
+
+    def predict(self, input_data):
+        proba, escalate = self._route(input_data)
+        predictions = self.classes_[proba.argmax(axis=1)]
+        if escalate.any():
+            predictions[escalate] = self.expensive.predict(input_data[escalate])
+        return predictions
+
+    def predict_proba(self, input_data):
+        # Callers asking for probabilities also predict, which counts the rows
+        proba, escalate = self._route(input_data, count=False)
+        if escalate.any():
+            proba[escalate] = self.expensive.predict_proba(input_data[escalate])
+        return proba
+
+    def stats(self):
+        """Return the rows scored, the rows escalated and the escalation rate."""
+        with self._lock:
+            return {
+                "rows": self.rows,
+                "escalated": self.escalated,
+                "escalation_rate": self.escalated / self.rows if self.rows else 0.0,
+            }
+
+
+def _cpu_seconds(predict, input_data, repeats=5):
+    # Best of a few runs, in CPU time so other processes do not skew it
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.process_time()
+        predictions = predict(input_data)
+        best = min(best, time.process_time() - start)
+    return best, predictions
+
+
+def evaluate(cheap, expensive, thresholds, data_path=None, registry=None):
+    """
+    Measure the cascade of `cheap` and `expensive` on the run.py test split.
+
+    Parameters:
+    - cheap (str): Name of the cheap model as shown in the app.
+    - expensive (str): Name of the expensive model.
+    - thresholds (list): Confidence thresholds to evaluate.
+    - data_path (str): Training CSV, final.csv by default.
+    - registry (ModelRegistry): Registry the models come from.
+
+    Returns one dict per (target, threshold) with the escalation rate, the
+    accuracies of the cascade and of both models alone, the cascade's
+    agreement with the expensive model and the CPU seconds both spent.
+    """
+    import run
+    from model_registry import TARGETS, get_registry
+
+    registry = registry or get_registry()
+    X, targets = run.load_data(data_path or run.DATA_PATH)
+    results = []
+    for target in TARGETS:
+        _, X_test, _, y_test = run.split_data(X, targets[target])
+        # The served models receive encoded NumPy rows, as in the app
+        features = X_test.to_numpy(dtype=np.float64)
+        labels = y_test.to_numpy()
+        cheap_model, expensive_model = registry.get(cheap, target), registry.get(expensive, target)
+        expensive_seconds, expensive_predictions = _cpu_seconds(expensive_model.predict, features)
+        cheap_accuracy = float((cheap_model.predict(features) == labels).mean())
+        for threshold in thresholds:
+            model = CascadeModel(cheap_model, expensive_model, threshold)
+            seconds, predictions = _cpu_seconds(model.predict, features)
+            results.append({
+                "target": target,
+                "threshold": threshold,
+                "escalation_rate": model.escalated / model.rows,
+                "accuracy": float((predictions == labels).mean()),
+                "cheap_accuracy": cheap_accuracy,
+                "expensive_accuracy": float((expensive_predictions == labels).mean()),
+                "agreement": float((predictions == expensive_predictions).mean()),
+                "cpu_seconds": seconds,
+                "expensive_cpu_seconds": expensive_seconds,
+            })
+    return results
+
+
+def main(argv=None):
+    from model_registry import MODEL_FILES
+
+    parser = argparse.ArgumentParser(description="Evaluate a cheap/expensive model cascade on the test split.")
+    parser.add_argument("--cheap", default="Logistic Regression", choices=list(MODEL_FILES))
+    parser.add_argument("--expensive", default="Support Vector Machine", choices=list(MODEL_FILES))
+    parser.add_argument("--thresholds", nargs="+", type=float, default=[0.6, 0.7, 0.8, 0.9, 0.95, 0.99])
+    parser.add_argument("--data", help="training CSV (default: final.csv)")
+    args = parser.parse_args(argv)
+
+    print(f"{cascade_name(args.cheap, args.expensive)}, run.py test split")
+    print(f"{'target':<8}{'threshold':>10}{'escalated':>11}{'accuracy':>10}{'cheap':>8}{'expensive':>11}"
+          f"{'agreement':>11}{'cpu (ms)':>10}{'vs expensive':>14}")
+    for result in evaluate(args.cheap, args.expensive, args.thresholds, args.data):
+        print(f"{result['target']:<8}{result['threshold']:>10.2f}{result['escalation_rate']:>11.1%}"
+              f"{result['accuracy']:>10.4f}{result['cheap_accuracy']:>8.4f}{result['expensive_accuracy']:>11.4f}"
+              f"{result['agreement']:>11.1%}{result['cpu_seconds'] * 1000:>10.2f}"
+              f"{result['cpu_seconds'] / result['expensive_cpu_seconds']:>13.0%}")
+
+
+if __name__ == "__main__":
+    main()
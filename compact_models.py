@@ -0,0 +1,610 @@
+"""
+Compact, inference-only model artifacts.
+
+`export_model` flattens a fitted model into a directory of plain NumPy arrays
+plus a small meta.json:
+
+- decision trees, random forests, bagged forests and AdaBoost: the nodes of
+  every tree concatenated into shared feature/threshold/children/value arrays,
+  in the layout the evaluator of tree_compiler.py walks (every leaf is its own
+  child),
+- XGBoost: the boosted trees in the same layout, with one leaf value per node,
+- SVC: support vectors, dual coefficients, intercepts and Platt parameters,
+- (scaled) logistic regression: scaler statistics, weights and intercepts,
+- any of these behind a column-selecting ColumnTransformer (the pipelines
+  written by slim.py): the indices of the input columns the model reads.
+
+`load_compact` memory-maps those arrays and evaluates them with NumPy alone
+(trees with the vectorized evaluator of tree_compiler.py),
+so serving processes neither import sklearn/xgboost nor unpickle Python
+objects, and every process that loads an artifact shares the same pages. The
+loaded models offer the `predict`, `predict_proba` and `classes_` the app and
+the batch scoring path use and follow the installed sklearn/xgboost
+prediction rules.
+
+Usage:
+    python compact_models.py                # export every pickle next to the app
+    python compact_models.py --verify final.csv
+"""
+import abc
+import argparse
+import json
+import os
+
+import numpy as np
+
+from tree_compiler import CHUNK_PAIRS, LEAF, accumulate, apply_trees
+
+META_FILE = "meta.json"
+# 2: leaves of tree models are their own children instead of LEAF
+FORMAT_VERSION = 2
+
+
+# Export (runs where the models are trained, needs sklearn/xgboost)
+
+def _save(path, kind, meta, arrays):
+    os.makedirs(path, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(path, f"{name}.npy"), np.ascontiguousarray(array))
+    # meta.json is written last so readers never see a half-written artifact
+    meta = dict(meta, kind=kind, format_version=FORMAT_VERSION, arrays=sorted(arrays))
+    tmp_path = os.path.join(path, META_FILE + ".tmp")
+    with open(tmp_path, "w") as meta_file:
+        json.dump(meta, meta_file)
+    os.replace(tmp_path, os.path.join(path, META_FILE))
+
+
+def _children(children, is_leaf, offset):
+    # Absolute child indices, every leaf pointing to itself as apply_trees expects
+    return np.where(is_leaf, np.arange(offset, offset + len(children)), children + offset)
+
+
+def _flatten_trees(groups, classes):
+    """
+    Concatenate sklearn trees into shared node arrays.
+
+    Parameters:
+    - groups (list): One (trees, features, tree_classes) entry per group of
+      trees averaged together, where `features` maps the tree's feature
+      indices to input columns (None for the identity) and `tree_classes`
+      are the classes the trees were fitted on.
+    - classes (ndarray): Classes of the whole model.
+    """
+    feature, threshold, left, right, value, roots, group_offsets = [], [], [], [], [], [], [0]
+    offset = 0
+    for trees, features, tree_classes in groups:
+        class_index = np.searchsorted(classes, tree_classes)
+        for tree in trees:
+            nodes = tree.tree_
+            is_leaf = nodes.children_left == LEAF
+            tree_feature = nodes.feature if features is None else np.asarray(features)[nodes.feature]
+            feature.append(np.where(is_leaf, 0, tree_feature))
+            threshold.append(nodes.threshold)
+            left.append(_children(nodes.children_left, is_leaf, offset))
+            right.append(_children(nodes.children_right, is_leaf, offset))
+            # Trees fitted on a bootstrap sample may have seen fewer classes
+            tree_value = np.zeros((nodes.node_count, len(classes)))
+            tree_value[:, class_index] = nodes.value[:, 0, :len(tree_classes)]
+            value.append(tree_value)
+            roots.append(offset)
+            offset += nodes.node_count
+        group_offsets.append(len(roots))
+    return {
+        "feature": np.concatenate(feature).astype(np.int32),
+        "threshold": np.concatenate(threshold).astype(np.float64),
+        "left": np.concatenate(left).astype(np.int32),
+        "right": np.concatenate(right).astype(np.int32),
+        "value": np.concatenate(value),
+        "roots": np.array(roots, dtype=np.int32),
+        "group_offsets": np.array(group_offsets, dtype=np.int32),
+    }
+
+
+def _tree_arrays(model):
+    # Returns the meta and arrays of a sklearn tree model
+    name = type(model).__name__
+    classes = np.asarray(model.classes_)
+    if name == "DecisionTreeClassifier":
+        groups, mode = [([model], None, classes)], "mean"
+    elif name in ("RandomForestClassifier", "ExtraTreesClassifier"):
+        groups, mode = [(model.estimators_, None, classes)], "mean"
+    elif name == "BaggingClassifier":
+        groups, mode = [], "mean"
+        for estimator, features in zip(model.estimators_, model.estimators_features_):
+            trees = getattr(estimator, "estimators_", [estimator])
+            groups.append((trees, features, classes[np.asarray(estimator.classes_, dtype=int)]))
+    else:
+        groups, mode = [(tree, None, classes) for tree in ([estimator] for estimator in model.estimators_)], "samme"
+
+    arrays = _flatten_trees(groups, classes)
+    arrays["classes"] = classes
+    if mode == "samme":
+        arrays["weights"] = np.asarray(model.estimator_weights_[:len(model.estimators_)], dtype=np.float64)
+    return {"mode": mode, "n_features": int(model.n_features_in_)}, arrays
+
+
+def _export_trees(model):
+    return ("trees", *_tree_arrays(model))
+
+
+def _xgboost_arrays(model):
+    # Returns the meta and arrays of an XGBClassifier
+    booster = model.get_booster()
+    learner = json.loads(booster.save_raw(raw_format="json"))["learner"]
+    objective = learner["objective"]["name"]
+    if objective not in ("multi:softprob", "multi:softmax", "binary:logistic"):
+        raise ValueError(f"Unsupported XGBoost objective {objective}")
+    trees = learner["gradient_booster"]["model"]["trees"]
+    base_score = np.array(learner["learner_model_param"]["base_score"].strip("[]").split(","), dtype=np.float32)
+    if objective == "binary:logistic":
+        # Stored as a probability, trees are added to its log-odds, computed
+        # in float32 the way XGBoost does
+        base_score = -np.log(np.float32(1) / base_score - np.float32(1))
+
+    feature, threshold, left, right, default_left, value, roots = [], [], [], [], [], [], []
+    offset = 0
+    for tree in trees:
+        children_left = np.array(tree["left_children"], dtype=np.int64)
+        is_leaf = children_left == LEAF
+        feature.append(np.where(is_leaf, 0, tree["split_indices"]))
+        # Leaves keep their weight in split_conditions
+        conditions = np.array(tree["split_conditions"], dtype=np.float32)
+        threshold.append(conditions)
+        value.append(np.where(is_leaf, conditions, 0))
+        left.append(_children(children_left, is_leaf, offset))
+        right.append(_children(np.array(tree["right_children"], dtype=np.int64), is_leaf, offset))
+        default_left.append(np.array(tree["default_left"], dtype=bool))
+        roots.append(offset)
+        offset += len(children_left)
+
+    arrays = {
+        "feature": np.concatenate(feature).astype(np.int32),
+        "threshold": np.concatenate(threshold).astype(np.float32),
+        "left": np.concatenate(left).astype(np.int32),
+        "right": np.concatenate(right).astype(np.int32),
+        "default_left": np.concatenate(default_left),
+        "value": np.concatenate(value).astype(np.float32),
+        "roots": np.array(roots, dtype=np.int32),
+        "tree_class": np.array(learner["gradient_booster"]["model"]["tree_info"], dtype=np.int32),
+        "base_score": base_score,
+        "classes": np.asarray(model.classes_),
+    }
+    return {"objective": objective, "n_features": int(model.n_features_in_)}, arrays
+
+
+def _export_xgboost(model):
+    return ("xgboost", *_xgboost_arrays(model))
+
+
+def _export_svc(model):
+    if model.kernel not in ("rbf", "linear", "poly", "sigmoid"):
+        raise ValueError(f"Unsupported SVC kernel {model.kernel}")
+    arrays = {
+        "support_vectors": np.asarray(model.support_vectors_, dtype=np.float64),
+        "dual_coef": np.asarray(model._dual_coef_, dtype=np.float64),
+        "intercept": np.asarray(model._intercept_, dtype=np.float64),
+        "n_support": np.asarray(model._n_support, dtype=np.int32),
+        "classes": np.asarray(model.classes_),
+    }
+    if getattr(model, "probability", False):
+        arrays["prob_a"] = np.asarray(model.probA_, dtype=np.float64)
+        arrays["prob_b"] = np.asarray(model.probB_, dtype=np.float64)
+    meta = {
+        "kernel": model.kernel,
+        "gamma": float(model._gamma),
+        "degree": int(model.degree),
+        "coef0": float(model.coef0),
+        "n_features": int(model.n_features_in_),
+    }
+    return "svc", meta, arrays
+
+
+def _export_linear(model):
+    steps = model.steps if type(model).__name__ == "Pipeline" else [("model", model)]
+    *scalers, (_, estimator) = steps
+    n_features = int(steps[0][1].n_features_in_)
+    arrays = {
+        "mean": np.zeros(n_features),
+        "scale": np.ones(n_features),
+        "coef": np.asarray(estimator.coef_, dtype=np.float64),
+        "intercept": np.asarray(estimator.intercept_, dtype=np.float64),
+        "classes": np.asarray(estimator.classes_),
+    }
+    for _, scaler in scalers:
+        if type(scaler).__name__ != "StandardScaler" or len(scalers) > 1:
+            raise ValueError("Only a single StandardScaler step is supported before the linear model")
+        if scaler.with_mean:
+            arrays["mean"] = np.asarray(scaler.mean_, dtype=np.float64)
+        if scaler.with_std:
+            arrays["scale"] = np.asarray(scaler.scale_, dtype=np.float64)
+    return "linear", {"n_features": n_features}, arrays
+
+
+_EXPORTERS = {
+    "DecisionTreeClassifier": _export_trees,
+    "RandomForestClassifier": _export_trees,
+    "ExtraTreesClassifier": _export_trees,
+    "BaggingClassifier": _export_trees,
+    "AdaBoostClassifier": _export_trees,
+    "XGBClassifier": _export_xgboost,
+    "SVC": _export_svc,
+    "LogisticRegression": _export_linear,
+    "Pipeline": _export_linear,
+}
+
+
+def _selected_columns(model):
+    # Returns the input columns kept by a pipeline starting with a column
+    # selection, or None for any other model
+    if type(model).__name__ != "Pipeline" or type(model.steps[0][1]).__name__ != "ColumnTransformer":
+        return None
+    selector = model.steps[0][1]
+    transformers = selector.transformers
+    if selector.remainder != "drop" or len(transformers) != 1 or transformers[0][1] != "passthrough":
+        raise ValueError("Only a ColumnTransformer passing one set of columns through is supported")
+    columns = np.asarray(transformers[0][2])
+    if columns.dtype.kind not in "iu":
+        raise ValueError("The columns must be selected by position")
+    return columns
+
+
+def export_model(model, path):
+    """
+    Write `model` as a compact artifact directory at `path`.
+
+    Raises ValueError for models the compact format does not cover, e.g. the
+    multi-output models or an AdaBoost over something other than trees.
+    """
+    columns = _selected_columns(model)
+    n_inputs = None
+    if columns is not None:
+        n_inputs = int(model.steps[0][1].n_features_in_)
+        model = model[1:] if len(model.steps) > 2 else model.steps[-1][1]
+    exporter = _EXPORTERS.get(type(model).__name__)
+    if exporter is None:
+        raise ValueError(f"No compact format for {type(model).__name__}")
+    if type(model).__name__ == "AdaBoostClassifier" and type(model.estimators_[0]).__name__ != "DecisionTreeClassifier":
+        raise ValueError("Only AdaBoost over decision trees has a compact format")
+    kind, meta, arrays = exporter(model)
+    if columns is not None:
+        meta = dict(meta, n_inputs=n_inputs)
+        arrays = dict(arrays, columns=columns.astype(np.int32))
+    _save(path, kind, meta, arrays)
+
+
+# Serving (NumPy only)
+
+def _row_chunks(n_rows, n_trees):
+    # Row ranges whose (row, tree) pairs, or (row, support vector) pairs of
+    # an SVC, fit in one CHUNK_PAIRS batch
+    chunk = max(1, CHUNK_PAIRS // max(n_trees, 1))
+    return [(start, min(start + chunk, n_rows)) for start in range(0, n_rows, chunk)]
+
+
+class CompactModel(abc.ABC):
+    """Base class of the loaded artifacts, mirroring the sklearn predict API."""
+
+    def __init__(self, meta, arrays):
+        self.meta = meta
+        self.arrays = arrays
+        self.classes_ = np.asarray(arrays["classes"])
+        self.n_features_in_ = meta["n_features"]
+
+    @abc.abstractmethod
+    def predict_proba(self, X):
+        """Return the probability of each class, shape (n_rows, n_classes)."""
+
+    def predict(self, X):
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1))
+
+
+class TreeModel(CompactModel):
+    """Decision tree, random forest, bagged forests or AdaBoost (SAMME)."""
+
+    def _leaves(self, X):
+        a = self.arrays
+        return apply_trees(X, a["feature"], a["threshold"], a["left"], a["right"], a["roots"])
+
+    def _in_chunks(self, X, evaluate):
+        # Evaluates row chunks so the per-tree temporaries stay bounded
+        X = np.asarray(X, dtype=np.float32)
+        chunks = _row_chunks(X.shape[0], len(self.arrays["roots"]))
+        if len(chunks) == 1:
+            return evaluate(X)
+        return np.concatenate([evaluate(X[start:stop]) for start, stop in chunks])
+
+    def predict_proba(self, X):
+        if self.meta["mode"] == "samme":
+            return self._samme_proba(self.decision_function(X))
+        return self._in_chunks(X, self._mean_proba)
+
+    def _mean_proba(self, X):
+        value = self.arrays["value"]
+        leaves = self._leaves(X)
+        offsets = self.arrays["group_offsets"]
+        # Mean over the trees of each group, then mean over the groups, summed
+        # in the same order as sklearn
+        groups = [accumulate(value[leaves[:, start:end]]) / (end - start)
+                  for start, end in zip(offsets[:-1], offsets[1:])]
+        return accumulate(np.stack(groups, axis=1)) / (len(offsets) - 1)
+
+    def decision_function(self, X):
+        decision = self._in_chunks(X, self._samme_decision)
+        if len(self.classes_) == 2:
+            decision[:, 0] *= -1
+            return decision.sum(axis=1)
+        return decision
+
+    def _samme_decision(self, X):
+        value, weights = self.arrays["value"], self.arrays["weights"]
+        n_classes = len(self.classes_)
+        votes = np.argmax(value[self._leaves(X)], axis=2)[:, :, np.newaxis] == np.arange(n_classes)
+        decision = accumulate(np.where(votes, weights[:, np.newaxis], -1 / (n_classes - 1) * weights[:, np.newaxis]))
+        return decision / weights.sum()
+
+    def _samme_proba(self, decision):
+        n_classes = len(self.classes_)
+        if n_classes == 2:
+            decision = np.vstack([-decision, decision]).T / 2
+        else:
+            decision = decision / (n_classes - 1)
+        return _softmax(decision)
+
+    def predict(self, X):
+        if self.meta["mode"] == "samme":
+            decision = self.decision_function(X)
+            if len(self.classes_) == 2:
+                return self.classes_.take((decision > 0).astype(int))
+            return self.classes_.take(np.argmax(decision, axis=1))
+        return super().predict(X)
+
+
+class XGBoostModel(CompactModel):
+    """Boosted trees of an XGBClassifier."""
+
+    def margins(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        chunks = _row_chunks(X.shape[0], len(self.arrays["roots"]))
+        if len(chunks) == 1:
+            return self._margins(X)
+        return np.concatenate([self._margins(X[start:stop]) for start, stop in chunks])
+
+    def _margins(self, X):
+        a = self.arrays
+        leaves = apply_trees(X, a["feature"], a["threshold"], a["left"], a["right"], a["roots"],
+                             default_left=a["default_left"], strict=True)
+        n_margins = 1 if self.meta["objective"] == "binary:logistic" else len(self.classes_)
+        margins = np.empty((X.shape[0], n_margins), dtype=np.float32)
+        margins[:] = a["base_score"]
+        values = a["value"][leaves]
+        # Trees are added one at a time in float32, as XGBoost does
+        for margin in range(n_margins):
+            margins[:, margin] = accumulate(values[:, a["tree_class"] == margin], initial=margins[:, margin])
+        return margins
+
+    def predict_proba(self, X):
+        margins = self.margins(X)
+        if self.meta["objective"] == "binary:logistic":
+            positive = 1 / (1 + np.exp(-margins[:, 0]))
+            return np.column_stack([1 - positive, positive])
+        return _softmax(margins)
+
+    def predict(self, X):
+        margins = self.margins(X)
+        if self.meta["objective"] == "binary:logistic":
+            return self.classes_.take((margins[:, 0] > 0).astype(int))
+        return self.classes_.take(np.argmax(margins, axis=1))
+
+
+class SVCModel(CompactModel):
+    """Support vector classifier, one-vs-one as in libsvm."""
+
+    def _kernel(self, X):
+        m, sv = self.meta, self.arrays["support_vectors"]
+        dot = X @ sv.T
+        if m["kernel"] == "linear":
+            return dot
+        if m["kernel"] == "poly":
+            return (m["gamma"] * dot + m["coef0"]) ** m["degree"]
+        if m["kernel"] == "sigmoid":
+            return np.tanh(m["gamma"] * dot + m["coef0"])
+        distances = (X ** 2).sum(axis=1)[:, np.newaxis] + (sv ** 2).sum(axis=1) - 2 * dot
+        return np.exp(-m["gamma"] * np.maximum(distances, 0))
+
+    def pairwise_decision(self, X):
+        """Return the libsvm decision value of each (i, j) class pair, i < j."""
+        X = np.asarray(X, dtype=np.float64)
+        # Row chunks bound the (rows, support vectors) kernel matrix, which
+        # for a whole batch would take gigabytes
+        chunks = _row_chunks(X.shape[0], len(self.arrays["support_vectors"]))
+        if len(chunks) == 1:
+            return self._pairwise_decision(X)
+        return np.concatenate([self._pairwise_decision(X[start:stop]) for start, stop in chunks])
+
+    def _pairwise_decision(self, X):
+        a = self.arrays
+        kernel = self._kernel(X)
+        starts = np.concatenate([[0], np.cumsum(a["n_support"])])
+        n_classes = len(self.classes_)
+        decisions = []
+        for i in range(n_classes):
+            for j in range(i + 1, n_classes):
+                rows_i, rows_j = slice(starts[i], starts[i + 1]), slice(starts[j], starts[j + 1])
+                decisions.append(kernel[:, rows_i] @ a["dual_coef"][j - 1, rows_i]
+                                 + kernel[:, rows_j] @ a["dual_coef"][i, rows_j]
+                                 + a["intercept"][len(decisions)])
+        return np.column_stack(decisions)
+
+    def predict(self, X):
+        decisions = self.pairwise_decision(X)
+        n_classes = len(self.classes_)
+        votes = np.zeros((decisions.shape[0], n_classes), dtype=np.int32)
+        pair = 0
+        for i in range(n_classes):
+            for j in range(i + 1, n_classes):
+                positive = decisions[:, pair] > 0
+                votes[:, i] += positive
+                votes[:, j] += ~positive
+                pair += 1
+        return self.classes_.take(np.argmax(votes, axis=1))
+
+    def predict_proba(self, X):
+        if "prob_a" not in self.arrays:
+            raise AttributeError("predict_proba is not available when the SVC was fitted with probability=False")
+        decisions = self.pairwise_decision(X)
+        fapb = decisions * self.arrays["prob_a"] + self.arrays["prob_b"]
+        pairwise = np.where(fapb >= 0, np.exp(-np.abs(fapb)) / (1 + np.exp(-np.abs(fapb))),
+                            1 / (1 + np.exp(-np.abs(fapb))))
+        pairwise = np.clip(pairwise, 1e-7, 1 - 1e-7)
+        return _couple_pairwise(pairwise, len(self.classes_))
+
+
+class LinearModel(CompactModel):
+    """Logistic regression, optionally preceded by a StandardScaler."""
+
+    def decision_function(self, X):
+        a = self.arrays
+        X = (np.asarray(X, dtype=np.float64) - a["mean"]) / a["scale"]
+        return X @ a["coef"].T + a["intercept"]
+
+    def predict_proba(self, X):
+        decision = self.decision_function(X)
+        if decision.shape[1] == 1:
+            positive = 1 / (1 + np.exp(-decision[:, 0]))
+            return np.column_stack([1 - positive, positive])
+        return _softmax(decision)
+
+    def predict(self, X):
+        decision = self.decision_function(X)
+        if decision.shape[1] == 1:
+            return self.classes_.take((decision[:, 0] > 0).astype(int))
+        return self.classes_.take(np.argmax(decision, axis=1))
+
+
+class SelectedColumns:
+    """A compact model reading only some of the input columns."""
+
+    def __init__(self, model, columns, n_features):
+        self.model = model
+        self.columns = np.asarray(columns)
+        self.classes_ = model.classes_
+        self.n_features_in_ = n_features
+
+    def predict(self, X):
+        return self.model.predict(np.asarray(X)[:, self.columns])
+
+    def predict_proba(self, X):
+        return self.model.predict_proba(np.asarray(X)[:, self.columns])
+
+
+def _softmax(scores):
+    scores = scores - scores.max(axis=1, keepdims=True)
+    exp = np.exp(scores)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def _couple_pairwise(pairwise, n_classes, max_iter=100):
+    """
+    Turn the pairwise probabilities of each row into class probabilities with
+    the iterative method of libsvm's multiclass_probability.
+    """
+    n_rows = pairwise.shape[0]
+    r = np.zeros((n_rows, n_classes, n_classes))
+    pair = 0
+    for i in range(n_classes):
+        for j in range(i + 1, n_classes):
+            r[:, i, j] = pairwise[:, pair]
+            r[:, j, i] = 1 - pairwise[:, pair]
+            pair += 1
+
+    Q = -r.transpose(0, 2, 1) * r
+    diagonal = (r ** 2).sum(axis=1)
+    Q[:, np.arange(n_classes), np.arange(n_classes)] = diagonal - np.diagonal(r ** 2, axis1=1, axis2=2)
+    p = np.full((n_rows, n_classes), 1 / n_classes)
+    eps = 0.005 / n_classes
+    active = np.arange(n_rows)
+    for _ in range(max(max_iter, n_classes)):
+        Qp = np.einsum("rtj,rj->rt", Q[active], p[active])
+        pQp = (p[active] * Qp).sum(axis=1)
+        converged = np.abs(Qp - pQp[:, np.newaxis]).max(axis=1) < eps
+        active, Qp, pQp = active[~converged], Qp[~converged], pQp[~converged]
+        if not active.size:
+            break
+        Qa, pa = Q[active], p[active]
+        for t in range(n_classes):
+            diff = (-Qp[:, t] + pQp) / Qa[:, t, t]
+            pa[:, t] += diff
+            pQp = (pQp + diff * (diff * Qa[:, t, t] + 2 * Qp[:, t])) / (1 + diff) / (1 + diff)
+            Qp = (Qp + diff[:, np.newaxis] * Qa[:, t, :]) / (1 + diff)[:, np.newaxis]
+            pa /= (1 + diff)[:, np.newaxis]
+        p[active] = pa
+    return p
+
+
+class FormatVersionError(ValueError):
+    """Raised for an artifact written in another version of the compact format."""
+
+
+_MODEL_KINDS = {"trees": TreeModel, "xgboost": XGBoostModel, "svc": SVCModel, "linear": LinearModel}
+
+
+def load_compact(path, mmap=True):
+    """
+    Load a compact artifact directory written by `export_model`.
+
+    Parameters:
+    - path (str): Artifact directory.
+    - mmap (bool): Memory-map the arrays instead of reading them into memory.
+
+    Raises FormatVersionError for artifacts of another format version.
+    """
+    with open(os.path.join(path, META_FILE)) as meta_file:
+        meta = json.load(meta_file)
+    if meta["format_version"] != FORMAT_VERSION:
+        raise FormatVersionError(f"{path} uses compact format {meta['format_version']}, expected {FORMAT_VERSION}; "
+                                 f"export it again with compact_models.py")
+    # Plain ndarray views of the maps: indexing a np.memmap costs a Python
+    # call per gather, which dominated the tree walks on large batches
+    arrays = {name: np.asarray(np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r" if mmap else None))
+              for name in meta["arrays"]}
+    model = _MODEL_KINDS[meta["kind"]](meta, arrays)
+    if "columns" in arrays:
+        return SelectedColumns(model, arrays["columns"], meta["n_inputs"])
+    return model
+
+
+def main(argv=None):
+    import joblib
+
+    from model_registry import MODEL_DIR, MODEL_FILES, TARGETS, compact_path, model_path
+
+    parser = argparse.ArgumentParser(description="Export the model pickles to the compact format.")
+    parser.add_argument("--model-dir", default=MODEL_DIR, help="directory holding the pickles")
+    parser.add_argument("--verify", metavar="CSV", help="compare compact and pickled predictions on this CSV")
+    args = parser.parse_args(argv)
+
+    features = None
+    if args.verify:
+        import pandas as pd
+
+        from feature_encoder import ENCODER
+
+        features = ENCODER.encode(pd.read_csv(args.verify))
+
+    for model_choice in MODEL_FILES:
+        for target in TARGETS:
+            path = model_path(model_choice, target, args.model_dir)
+            if not os.path.exists(path):
+                continue
+            model = joblib.load(path)
+            output = compact_path(model_choice, target, args.model_dir)
+            export_model(model, output)
+            line = f"{model_choice:<26}{target:<4} -> {output}"
+            if features is not None:
+                agreement = (load_compact(output).predict(features) == model.predict(features)).mean()
+                line += f"  (agreement {agreement:.2%})"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Columnar cache of the training dataset.
+
+final.csv has full survey questions as column names and is parsed again by
+every training and evaluation run. `load_dataset` parses it once into a cache
+directory next to it: one memory-mapped .npy file per column under a short id
+(c00, c01, ...), each stored in the smallest dtype holding its values (int8
+for the answer codes), with the question text, dtypes and the source file's
+size and modification time kept in meta.json. Later loads map the arrays
+instead of parsing the CSV; the cache is rebuilt automatically when the CSV
+changes. Text columns, if any, are stored as integer codes with their
+categories in the metadata.
+
+Usage:
+    python dataset.py                      # build the cache of final.csv if stale and list its columns
+    python dataset.py --data export.csv --rebuild
+"""
+import argparse
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "final.csv")
+
+# Cache directories are created in this directory, next to the source CSV
+CACHE_DIR = ".dataset_cache"
+META_FILE = "meta.json"
+CACHE_VERSION = 1
+
+
+def cache_path(data_path):
+    """Return the cache directory of the CSV at `data_path`."""
+    directory, name = os.path.split(os.path.abspath(data_path))
+    return os.path.join(directory, CACHE_DIR, os.path.splitext(name)[0])
+
+
+def _source_stamp(data_path):
+    stat = os.stat(data_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _compact_dtype(values):
+    """Return the smallest dtype holding `values` without loss."""
+    if values.dtype.kind in "iu":
+        if len(values) == 0:
+            return np.dtype(np.int8)
+        low, high = values.min(), values.max()
+        for dtype in (np.int8, np.int16, np.int32, np.int64):
+            if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max:
+                return np.dtype(dtype)
+    if values.dtype.kind == "f" and np.array_equal(values.astype(np.float32), values, equal_nan=True):
+        return np.dtype(np.float32)
+    return values.dtype
+
+
+def read_meta(data_path):
+    """Return the metadata of the cache of `data_path`, or None if it has none."""
+    try:
+        with open(os.path.join(cache_path(data_path), META_FILE)) as meta_file:
+            return json.load(meta_file)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def is_stale(data_path):
+    """Return whether the cache of `data_path` is missing or older than the CSV."""
+    meta = read_meta(data_path)
+    return meta is None or meta.get("version") != CACHE_VERSION or meta["source"] != _source_stamp(data_path)
+
+
+def build_cache(data_path=DATA_PATH):
+    """
+    Parse the CSV at `data_path` into its columnar cache and return the
+    metadata of the new cache.
+    """
+    stamp = _source_stamp(data_path)
+    frame = pd.read_csv(data_path)
+
+    target = cache_path(data_path)
+    building = f"{target}.building-{os.getpid()}"
+    os.makedirs(building)
+    columns = []
+    for index, name in enumerate(frame.columns):
+        column = {"id": f"c{index:02d}", "name": name}
+        series = frame[name]
+        if series.dtype == object or isinstance(series.dtype, pd.StringDtype):
+            categorical = pd.Categorical(series)
+            column["categories"] = [str(category) for category in categorical.categories]
+            values = categorical.codes
+        else:
+            values = series.to_numpy()
+        values = values.astype(_compact_dtype(values), copy=False)
+        column["dtype"] = values.dtype.str
+        np.save(os.path.join(building, f"{column['id']}.npy"), values)
+        columns.append(column)
+
+    meta = {"version": CACHE_VERSION, "source": stamp, "rows": len(frame), "columns": columns}
+    with open(os.path.join(building, META_FILE), "w") as meta_file:
+        json.dump(meta, meta_file, indent=2)
+
+    # Swap the finished cache in, so readers never see a partial one
+    if os.path.exists(target):
+        retired = f"{target}.old-{os.getpid()}"
+        os.replace(target, retired)
+        shutil.rmtree(retired, ignore_errors=True)
+    os.replace(building, target)
+    return meta
+
+
+def ensure_cache(data_path=DATA_PATH, rebuild=False):
+    """Build the cache of `data_path` if it is missing or stale, and return its metadata."""
+    if rebuild or is_stale(data_path):
+        return build_cache(data_path)
+    return read_meta(data_path)
+
+
+def load_columns(data_path=DATA_PATH, columns=None, meta=None):
+    """
+    Return the memory-mapped arrays of the cache, keyed by column name.
+
+    Parameters:
+    - data_path (str): Source CSV.
+    - columns (list): Column names to load, all of them by default.
+    - meta (dict): Metadata of an up-to-date cache, checked first when omitted.
+    """
+    meta = meta or ensure_cache(data_path)
+    directory = cache_path(data_path)
+    wanted = set(columns) if columns is not None else None
+    arrays = {}
+    for column in meta["columns"]:
+        if wanted is None or column["name"] in wanted:
+            arrays[column["name"]] = np.load(os.path.join(directory, f"{column['id']}.npy"), mmap_mode="r")
+    return arrays
+
+
+def load_dataset(data_path=DATA_PATH, columns=None):
+    """
+    Return the dataset as a DataFrame with its original column names, read
+    from the columnar cache (built first when missing or stale).
+
+    Parameters:
+    - data_path (str): Source CSV.
+    - columns (list): Column names to load, all of them by default.
+    """
+    meta = ensure_cache(data_path)
+    arrays = load_columns(data_path, columns, meta)
+    frame = pd.DataFrame(arrays, copy=False)
+    for column in meta["columns"]:
+        if "categories" in column and column["name"] in arrays:
+            frame[column["name"]] = pd.Categorical.from_codes(arrays[column["name"]], column["categories"])
+    return frame
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the columnar cache of a training CSV.")
+    parser.add_argument("--data", default=DATA_PATH, help="source CSV (default: final.csv)")
+    parser.add_argument("--rebuild", action="store_true", help="rebuild the cache even when it is up to date")
+    args = parser.parse_args(argv)
+
+    stale = args.rebuild or is_stale(args.data)
+    meta = ensure_cache(args.data, args.rebuild)
+    directory = cache_path(args.data)
+    size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+    print(f"{'Rebuilt' if stale else 'Up to date'}: {directory} ({meta['rows']} rows, {size / 1024:.0f} KB, "
+          f"CSV {os.path.getsize(args.data) / 1024:.0f} KB)")
+    for column in meta["columns"]:
+        print(f"{column['id']:<6}{np.dtype(column['dtype']).name:<9}{column['name'][:90]}")
+
+
+if __name__ == "__main__":
+    main()
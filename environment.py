@@ -0,0 +1,47 @@
+"""
+Versions of the libraries the models are trained and served with, and hashes
+of the data they are trained on.
+
+benchmark.py and evaluate.py record them next to their results, and tune.py
+keys its cache of fold scores on them, since a new sklearn or xgboost, or a
+new final.csv, can change what a fit returns. Importing this module imports
+none of the libraries.
+
+Usage:
+    python environment.py             # print the installed versions
+"""
+import hashlib
+import importlib
+
+# Libraries recorded by default, by import name
+LIBRARIES = ("numpy", "pandas", "sklearn", "xgboost")
+
+
+def library_versions(names=LIBRARIES):
+    """
+    Return the installed version of each library, None for the missing ones.
+
+    Parameters:
+    - names (tuple): Import names of the libraries.
+    """
+    versions = {}
+    for name in names:
+        try:
+            versions[name] = importlib.import_module(name).__version__
+        except ImportError:
+            versions[name] = None
+    return versions
+
+
+def file_hash(path):
+    """Return the SHA-256 of the file at `path`."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as data_file:
+        for block in iter(lambda: data_file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+if __name__ == "__main__":
+    for name, version in library_versions().items():
+        print(f"{name:<10}{version or 'not installed'}")
@@ -0,0 +1,317 @@
+"""
+Cross-validated evaluation of the seven model families shown in the app.
+
+Every (family, target, fold) fit of a stratified k-fold cross-validation over
+final.csv runs as one joblib task, spread over all cores. The encoded
+features and both targets are memory-mapped once and shared by the workers
+instead of being copied into each task. Each task measures, on its held-out
+fold:
+
+- f1, precision, recall: weighted over the classes, as run.py scores models,
+- roc_auc: one-vs-rest, weighted, from predict_proba,
+- fit_seconds, predict_ms_per_row (one batch predict of the fold) and
+  latency_ms (p50 of single-row predicts), in CPU time of the worker so the
+  other workers do not skew them, and pickle_bytes.
+
+The mean and standard deviation over the folds are written to a versioned
+metrics file, metrics/metrics-<UTC time>.json, and copied to
+metrics/latest.json, which the app reads at start-up for the F1 scores it
+shows (falling back to its hardcoded ones). Families left out with --models
+keep their previous results in latest.json, so every model entry records the
+run it comes from: its time, the hash of the data, the cross-validation
+settings and the library versions.
+
+Logistic regression is not trained by run.py; it is evaluated as the
+notebook built it, a StandardScaler followed by a one-vs-rest logistic
+regression with LOGREG_PARAMS.
+
+Usage:
+    python evaluate.py                                # 5 folds, every family, all cores
+    python evaluate.py --models xgboost random_forest --folds 10
+    python evaluate.py --params tuned_params.json     # evaluate the parameters found by tune.py
+"""
+import argparse
+import datetime
+import json
+import os
+import time
+
+from environment import file_hash, library_versions
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+METRICS_DIR = os.path.join(HERE, 'metrics')
+LATEST_FILE = 'latest.json'
+LATEST_PATH = os.path.join(METRICS_DIR, LATEST_FILE)
+
+# 2: data, cv and libraries are recorded per model entry
+SCHEMA_VERSION = 2
+
+LOGREG_PARAMS = {'solver': 'liblinear', 'max_iter': 1000, 'C': 1.624}
+
+METRICS = ('f1', 'precision', 'recall', 'roc_auc', 'fit_seconds', 'predict_ms_per_row', 'latency_ms', 'pickle_bytes')
+
+
+def build_model(family, params=None):
+    """
+    Return an unfitted model of `family` (a model file prefix, see
+    model_registry.MODEL_FILES) with its final parameters, single-threaded.
+    """
+    import run
+
+    if family in run.MODEL_SPECS:
+        return run.build_model(family, n_jobs=1, params=params)
+    if family != 'logreg':
+        raise ValueError(f"Unknown model family {family}")
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.multiclass import OneVsRestClassifier
+    from sklearn.pipeline import make_pipeline
+    from sklearn.preprocessing import StandardScaler
+
+    # liblinear was one-vs-rest for the three classes when the notebook fitted
+    # it; newer sklearn versions need the explicit wrapper
+    model = LogisticRegression(**dict(LOGREG_PARAMS, **(params or {})))
+    return make_pipeline(StandardScaler(), OneVsRestClassifier(model))
+
+
+def _roc_auc(y_true, proba, classes):
+    from sklearn.metrics import roc_auc_score
+
+    try:
+        if len(classes) == 2:
+            return float(roc_auc_score(y_true, proba[:, 1]))
+        return float(roc_auc_score(y_true, proba, multi_class='ovr', average='weighted', labels=classes))
+    except ValueError:
+        # A fold missing one of the classes has no AUC
+        return float('nan')
+
+
+def evaluate_fold(family, target, fold, X, y, train_index, test_index, params=None, latency_samples=50,
+                  latency_seconds=1.0):
+    """
+    Fit `family` on the training rows of one fold and score it on the others.
+
+    Parameters:
+    - family (str): Model file prefix, e.g. "xgboost".
+    - target (str): "y1" or "y2".
+    - fold (int): Index of the fold.
+    - X (ndarray): Encoded features of every row, memory-mapped by joblib.
+    - y (ndarray): Labels of `target`.
+    - train_index, test_index (ndarray): Rows of the fold.
+    - params (dict): Parameters overriding the family's final ones.
+    - latency_samples (int): Single-row predicts timed for the latency.
+    - latency_seconds (float): CPU time after which slow models stop timing
+      single-row predicts (at least 3 are timed).
+
+    Returns a dict of the fold's metrics.
+    """
+    import io
+
+    import joblib
+    import numpy as np
+    from sklearn.metrics import f1_score, precision_score, recall_score
+
+    X_train, y_train = X[train_index], y[train_index]
+    X_test, y_test = X[test_index], y[test_index]
+    model = build_model(family, params)
+    start = time.process_time()
+    model.fit(X_train, y_train)
+    fit_seconds = time.process_time() - start
+
+    start = time.process_time()
+    predictions = model.predict(X_test)
+    predict_seconds = time.process_time() - start
+    proba = model.predict_proba(X_test)
+    samples = []
+    for index in range(min(latency_samples, len(X_test))):
+        start = time.process_time()
+        model.predict(X_test[index:index + 1])
+        samples.append(time.process_time() - start)
+        if len(samples) >= 3 and sum(samples) > latency_seconds:
+            break
+
+    buffer = io.BytesIO()
+    joblib.dump(model, buffer)
+    return {
+        'family': family,
+        'target': target,
+        'fold': fold,
+        'f1': float(f1_score(y_test, predictions, average='weighted')),
+        'precision': float(precision_score(y_test, predictions, average='weighted', zero_division=0)),
+        'recall': float(recall_score(y_test, predictions, average='weighted', zero_division=0)),
+        'roc_auc': _roc_auc(y_test, proba, model.classes_),
+        'fit_seconds': fit_seconds,
+        'predict_ms_per_row': predict_seconds / len(X_test) * 1000,
+        'latency_ms': float(np.median(samples) * 1000),
+        'pickle_bytes': buffer.tell(),
+    }
+
+
+def evaluate_all(families=None, targets=None, folds=5, workers=-1, data_path=None, params=None, seed=25):
+    """
+    Cross-validate every (family, target) pair, all folds in parallel.
+
+    Parameters:
+    - families (list): Model file prefixes, all seven by default.
+    - targets (list): Targets to evaluate, both by default.
+    - folds (int): Number of stratified folds.
+    - workers (int): joblib worker processes, -1 for one per core.
+    - data_path (str): Training CSV, final.csv by default.
+    - params (dict): Maps families to parameters overriding their final ones.
+    - seed (int): Seed of the fold shuffling.
+
+    Returns the per-fold results.
+    """
+    import numpy as np
+    from joblib import Parallel, delayed
+    from sklearn.model_selection import StratifiedKFold
+
+    import run
+    from model_registry import TARGETS
+
+    # Slowest families first (run.MODEL_SPECS order), logistic regression last
+    order = list(run.MODEL_SPECS) + ['logreg']
+    families = [family for family in order if family in (families or order)]
+    X, target_series = run.load_data(data_path or run.DATA_PATH)
+    features = X.to_numpy(dtype=np.float64)
+    labels = {target: target_series[target].to_numpy() for target in targets or TARGETS}
+    params = params or {}
+
+    tasks = []
+    for family in families:
+        for target, y in labels.items():
+            splits = StratifiedKFold(folds, shuffle=True, random_state=seed).split(features, y)
+            for fold, (train_index, test_index) in enumerate(splits):
+                tasks.append(delayed(evaluate_fold)(family, target, fold, features, y, train_index, test_index,
+                                                    params.get(family)))
+    # max_nbytes=0 memory-maps every array argument once for all workers
+    return Parallel(n_jobs=workers, max_nbytes=0, mmap_mode='r', verbose=5)(tasks)
+
+
+def summarize(fold_results):
+    """Return the mean and standard deviation over the folds, per model name and target."""
+    import numpy as np
+
+    from model_registry import MODEL_FILES
+
+    names = {prefix: model_choice for model_choice, prefix in MODEL_FILES.items()}
+    grouped = {}
+    for result in fold_results:
+        grouped.setdefault((result['family'], result['target']), []).append(result)
+    models = {}
+    for (family, target), results in grouped.items():
+        summary = {'folds': len(results)}
+        for metric in METRICS:
+            values = np.array([result[metric] for result in results], dtype=np.float64)
+            summary[metric] = {'mean': float(np.nanmean(values)), 'std': float(np.nanstd(values))}
+        models.setdefault(names[family], {})[target] = summary
+    return models
+
+
+def write_metrics(models, folds, seed, data_path, output_dir=METRICS_DIR):
+    """
+    Write a versioned metrics file and point latest.json at it, keeping the
+    previous results of the models that were not evaluated this time.
+
+    Returns the path of the versioned file.
+    """
+    now = datetime.datetime.now(datetime.timezone.utc)
+    version = now.strftime('%Y%m%dT%H%M%SZ')
+    # Entries of earlier runs are kept in latest.json, so each one records
+    # what it was evaluated on
+    run_info = {
+        'evaluated': version,
+        'data': {'path': os.path.basename(data_path), 'sha256': file_hash(data_path)},
+        'cv': {'folds': folds, 'shuffle_seed': seed, 'stratified': True},
+        'libraries': library_versions(),
+    }
+    for targets in models.values():
+        for summary in targets.values():
+            summary.update(run_info)
+    latest_path = os.path.join(output_dir, LATEST_FILE)
+    previous = read_metrics(latest_path) or {'models': {}}
+    merged = previous['models']
+    for model_choice, targets in models.items():
+        merged.setdefault(model_choice, {}).update(targets)
+    metrics = {
+        'schema': SCHEMA_VERSION,
+        'version': version,
+        'created': now.isoformat(timespec='seconds'),
+        'models': merged,
+    }
+
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f'metrics-{version}.json')
+    with open(path, 'w') as metrics_file:
+        json.dump(metrics, metrics_file, indent=2)
+    temporary = f'{latest_path}.tmp'
+    with open(temporary, 'w') as latest_file:
+        json.dump(metrics, latest_file, indent=2)
+    os.replace(temporary, latest_path)
+    return path
+
+
+def read_metrics(path=LATEST_PATH):
+    """Return the metrics file at `path`, or None when missing or of another schema."""
+    try:
+        with open(path) as metrics_file:
+            metrics = json.load(metrics_file)
+    except (FileNotFoundError, ValueError):
+        return None
+    return metrics if metrics.get('schema') == SCHEMA_VERSION else None
+
+
+def read_f1_scores(path=LATEST_PATH, fallback=None):
+    """
+    Return the cross-validated F1 of each model and target, as
+    {model name: {"y1": f1, "y2": f1}}, rounded like the app shows them.
+
+    Models or targets the metrics file lacks (or every one, when there is no
+    file) take their score from `fallback`.
+    """
+    scores = {model_choice: dict(targets) for model_choice, targets in (fallback or {}).items()}
+    metrics = read_metrics(path)
+    if metrics is not None:
+        for model_choice, targets in metrics['models'].items():
+            for target, summary in targets.items():
+                scores.setdefault(model_choice, {})[target] = round(summary['f1']['mean'], 4)
+    return scores
+
+
+def print_summary(models):
+    print(f"\n{'model':<26}{'target':<8}{'F1':>16}{'precision':>11}{'recall':>9}{'ROC-AUC':>9}{'fit (s)':>9}"
+          f"{'ms/row':>9}{'p50 (ms)':>10}{'size (KB)':>11}")
+    for model_choice, targets in models.items():
+        for target, summary in sorted(targets.items()):
+            f1 = summary['f1']
+            print(f"{model_choice:<26}{target:<8}{f1['mean']:>9.4f} ±{f1['std']:.3f}"
+                  f"{summary['precision']['mean']:>11.4f}{summary['recall']['mean']:>9.4f}"
+                  f"{summary['roc_auc']['mean']:>9.4f}{summary['fit_seconds']['mean']:>9.2f}"
+                  f"{summary['predict_ms_per_row']['mean']:>9.4f}{summary['latency_ms']['mean']:>10.3f}"
+                  f"{summary['pickle_bytes']['mean'] / 1024:>11.0f}")
+
+
+def main(argv=None):
+    import run
+    from model_registry import MODEL_FILES, TARGETS
+
+    parser = argparse.ArgumentParser(description="Cross-validate the Y1 and Y2 models and write their metrics.")
+    parser.add_argument('--models', nargs='+', choices=list(MODEL_FILES.values()), help="families to evaluate")
+    parser.add_argument('--targets', nargs='+', choices=TARGETS, default=list(TARGETS))
+    parser.add_argument('--folds', type=int, default=5, help="cross-validation folds (default: 5)")
+    parser.add_argument('--workers', type=int, default=-1, help="worker processes (default: one per CPU core)")
+    parser.add_argument('--seed', type=int, default=25, help="seed of the fold shuffling")
+    parser.add_argument('--data', default=run.DATA_PATH, help="training CSV (default: final.csv)")
+    parser.add_argument('--params', help="tune.py result file whose parameters override the final ones")
+    parser.add_argument('--output-dir', default=METRICS_DIR, help="directory of the metrics files (default: metrics/)")
+    args = parser.parse_args(argv)
+
+    params = run.load_params(args.params) if args.params else None
+    start = time.perf_counter()
+    models = summarize(evaluate_all(args.models, args.targets, args.folds, args.workers, args.data, params, args.seed))
+    path = write_metrics(models, args.folds, args.seed, args.data, args.output_dir)
+    print_summary(models)
+    print(f"\nEvaluated in {time.perf_counter() - start:.1f}s, metrics written to {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+"""
+Feature encoding shared by the Streamlit app and the batch scoring path.
+
+The encoding is driven by one declarative schema (FEATURE_TABLE and
+ANSWER_CODES in survey_schema.py): for every model input column, in the order
+run.py trains on, it lists the form answer feeding it (with that answer's
+category codes) and the value used when it is missing. `FeatureEncoder` turns
+a dict, a list of dicts or a DataFrame into a contiguous float array in that
+column order. Inputs may be keyed by the survey question (the column names of
+final.csv) or by the app's answer names, and may hold either answer labels
+("Yes") or already encoded values (1). Labels keyed by a question are decoded
+with the codes of that question (QUESTION_ANSWERS), labels keyed by an answer
+name with the codes of the answer; labels that are not answers raise
+ValueError, except for the free-text answers of UNKNOWN_CODES.
+"""
+import numpy as np
+
+from survey_schema import ANSWER_CODES, FEATURE_TABLE, QUESTION_ANSWERS, UNKNOWN_CODES
+
+
+class AnswerCodes:
+    """
+    Category codes of the labels of one answer.
+
+    Parameters:
+    - name (str): Answer or question the labels belong to, used in errors.
+    - codes (dict): Maps answer labels to their code, empty for numeric answers.
+    - unknown (float): Code of labels missing from `codes`, or None to reject
+      them with a ValueError.
+    """
+
+    def __init__(self, name, codes, unknown=None):
+        self.name = name
+        self.codes = codes
+        self.unknown = unknown
+        self.labels = list(codes)
+        # Code of each label, followed by NaN for labels that are not known
+        self.lookup = np.array([float(code) for code in codes.values()] + [np.nan])
+
+    def decode(self, label):
+        """Return the code of one label, or its value if it is numeric."""
+        if label in self.codes:
+            return float(self.codes[label])
+        try:
+            return float(label)
+        except ValueError:
+            if self.unknown is None:
+                raise ValueError(f"{label!r} is not an answer to {self.name!r}") from None
+            return float(self.unknown)
+
+    def decode_series(self, series):
+        """Decode a column of labels at once; missing values stay NaN."""
+        import pandas as pd
+
+        values = self.lookup[pd.Index(self.labels, dtype=object).get_indexer(series)]
+        unknown = np.isnan(values)
+        if unknown.any():
+            labels = series[unknown]
+            numeric = pd.to_numeric(labels, errors="coerce").to_numpy(dtype=np.float64, copy=True)
+            rejected = np.isnan(numeric) & labels.notna().to_numpy()
+            if rejected.any():
+                if self.unknown is None:
+                    examples = sorted(set(map(str, labels[rejected])))[:5]
+                    raise ValueError(f"{int(rejected.sum())} values are not answers to {self.name!r}, "
+                                     f"e.g. {examples}")
+                numeric[rejected] = self.unknown
+            values[unknown] = numeric
+        return values
+
+
+class Feature:
+    """
+    One model input column.
+
+    Parameters:
+    - column (str): Column name in final.csv.
+    - answer (str): Name of the form answer feeding the column, or None.
+    - codes (AnswerCodes): Codes of the column's own question, used for
+      inputs keyed by the column name.
+    - answer_codes (AnswerCodes): Codes of `answer`, used for inputs keyed by
+      the answer name.
+    - default (float): Value used when the input is missing.
+    """
+
+    def __init__(self, column, answer, codes, answer_codes, default):
+        self.column = column
+        self.answer = answer
+        self.codes = codes
+        self.answer_codes = answer_codes
+        self.default = float(default)
+
+    def encode_value(self, value, by_answer=False):
+        """
+        Encode a single answer label or numeric value, keyed by the answer
+        name if `by_answer` is set and by the column name otherwise. Raises
+        ValueError for labels that are not answers to the question.
+        """
+        if value is None:
+            return self.default
+        if isinstance(value, str):
+            value = (self.answer_codes if by_answer else self.codes).decode(value)
+        value = float(value)
+        return self.default if np.isnan(value) else value
+
+    def encode_series(self, series, by_answer=False):
+        """Encode a whole column of answers at once, keyed as in `encode_value`."""
+        import pandas as pd
+
+        if pd.api.types.is_numeric_dtype(series.dtype):
+            values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        else:
+            values = (self.answer_codes if by_answer else self.codes).decode_series(series)
+        return np.where(np.isnan(values), self.default, values)
+
+
+class FeatureEncoder:
+    """
+    Encodes survey answers into the model input matrix.
+
+    Parameters:
+    - table (list): (column, answer, default) entries as in FEATURE_TABLE.
+    - answer_codes (dict): Category codes of each answer as in ANSWER_CODES.
+    - question_answers (dict): Answer asked by each question as in
+      QUESTION_ANSWERS.
+    - unknown_codes (dict): Code of unknown labels of the answers accepting
+      free text, as in UNKNOWN_CODES.
+    """
+
+    def __init__(self, table=FEATURE_TABLE, answer_codes=ANSWER_CODES, question_answers=QUESTION_ANSWERS,
+                 unknown_codes=UNKNOWN_CODES):
+        def codes_of(answer, name):
+            return AnswerCodes(name, answer_codes.get(answer, {}), unknown_codes.get(answer))
+
+        self.features = [Feature(column, answer, codes_of(question_answers.get(column), column),
+                                 codes_of(answer, answer), default)
+                         for column, answer, default in table]
+
+    @property
+    def columns(self):
+        """Model input column names, in training order."""
+        return [feature.column for feature in self.features]
+
+    def encode(self, data):
+        """
+        Encode `data` into a C-contiguous float64 array of shape
+        (rows, len(columns)).
+
+        Parameters:
+        - data (dict, list of dicts or DataFrame): Answers keyed by column name
+          or by answer name. Missing keys take the feature's default; labels
+          that are not answers to their question raise ValueError.
+        """
+        if isinstance(data, dict):
+            return self._encode_record(data)
+        # pandas is only needed for batches; single records skip importing it
+        import pandas as pd
+
+        if not isinstance(data, pd.DataFrame):
+            data = pd.DataFrame.from_records(data)
+        return self._encode_frame(data)
+
+    def _encode_record(self, record):
+        row = np.empty((1, len(self.features)), dtype=np.float64)
+        for index, feature in enumerate(self.features):
+            if feature.column in record:
+                row[0, index] = feature.encode_value(record[feature.column])
+            elif feature.answer is not None:
+                row[0, index] = feature.encode_value(record.get(feature.answer), by_answer=True)
+            else:
+                row[0, index] = feature.default
+        return row
+
+    def _encode_frame(self, frame):
+        matrix = np.empty((len(frame), len(self.features)), dtype=np.float64)
+        # Several columns are fed by the same answer, so encode each answer once
+        encoded_answers = {}
+        for index, feature in enumerate(self.features):
+            if feature.column in frame.columns:
+                matrix[:, index] = feature.encode_series(frame[feature.column])
+            elif feature.answer is not None and feature.answer in frame.columns:
+                key = (feature.answer, feature.default)
+                if key not in encoded_answers:
+                    encoded_answers[key] = feature.encode_series(frame[feature.answer], by_answer=True)
+                matrix[:, index] = encoded_answers[key]
+            else:
+                matrix[:, index] = feature.default
+        return matrix
+
+
+# Encoder for the schema above, shared by the app and the batch scoring path
+ENCODER = FeatureEncoder()
@@ -0,0 +1,308 @@
+"""
+Timing instrumentation of the prediction flow.
+
+The stages of a prediction are wrapped in spans, either as a context manager
+or as a decorator:
+
+    with instrumentation.request("app.predict", model=model_choice):
+        with instrumentation.span("encode"):
+            input_data = ENCODER.encode(answers)
+
+    @instrumentation.traced("display")
+    def display_predictions(...): ...
+
+Every finished span is added to the stage_latency_seconds histogram. Spans
+opened inside a `request` are also collected into one record per request,
+with the seconds spent in each stage, which is appended as a JSON line to the
+timing log. `render_metrics` returns every histogram in the Prometheus text
+format; serve.py answers /metrics with it and, for the app, it is written to
+a metrics file after each request.
+
+Instrumentation is off unless `enable` is called or one of these environment
+variables is set when this module is imported:
+
+- APP_TIMING_LOG: file the per-request records are appended to,
+- APP_METRICS_FILE: file rewritten with the histograms after each request,
+- APP_PROFILE_DIR: profile the next request with cProfile and dump the
+  statistics to this directory (`profile_next` arms it again).
+
+When off, a span costs one flag check: `span` returns a shared no-op context
+manager and traced functions are called directly.
+
+Usage:
+    APP_TIMING_LOG=timing.jsonl streamlit run app.py
+    python instrumentation.py timing.jsonl          # per-stage latency percentiles of a timing log
+"""
+import argparse
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# Every histogram created, in the order /metrics renders them
+_histograms = []
+
+
+class Histogram:
+    """Cumulative histogram rendered in the Prometheus text format."""
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+        _histograms.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            counts, total = self._series.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            counts[-1] += 1
+            self._series[key] = (counts, total + value)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((key, (list(counts), total)) for key, (counts, total) in self._series.items())
+        for key, (counts, total) in series:
+            labels = ",".join(f'{name}="{value}"' for name, value in key)
+            prefix = f"{labels}," if labels else ""
+            for bound, count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {counts[-1]}')
+            lines.append(f"{self.name}_sum{{{labels}}} {total}")
+            lines.append(f"{self.name}_count{{{labels}}} {counts[-1]}")
+        return "\n".join(lines)
+
+
+STAGE_LATENCY = Histogram("stage_latency_seconds", "Time spent in each stage of a prediction.", LATENCY_BUCKETS)
+REQUEST_TOTAL = Histogram("instrumented_request_seconds", "Time to handle an instrumented request.", LATENCY_BUCKETS)
+
+
+def render_metrics():
+    """Return every histogram in the Prometheus text format."""
+    return "\n".join(histogram.render() for histogram in _histograms) + "\n"
+
+
+class _Settings:
+    enabled = False
+    timing_log = None
+    metrics_file = None
+    profile_dir = None
+
+
+_settings = _Settings()
+_current = contextvars.ContextVar("instrumentation_request", default=None)
+_write_lock = threading.Lock()
+
+
+def enable(timing_log=None, metrics_file=None):
+    """
+    Turn instrumentation on.
+
+    Parameters:
+    - timing_log (str): File the per-request records are appended to.
+    - metrics_file (str): File rewritten with the histograms after each request.
+    """
+    _settings.timing_log = timing_log or _settings.timing_log
+    _settings.metrics_file = metrics_file or _settings.metrics_file
+    _settings.enabled = True
+
+
+def disable():
+    """Turn instrumentation off; histograms keep what they collected."""
+    _settings.enabled = False
+
+
+def is_enabled():
+    """Return whether spans are being recorded."""
+    return _settings.enabled
+
+
+def profile_next(directory):
+    """Profile the next request with cProfile, dumping the stats to `directory`."""
+    _settings.profile_dir = directory
+    _settings.enabled = True
+
+
+class _NoSpan:
+    """What `span` returns while instrumentation is off."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class _Span:
+    __slots__ = ("name", "started")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self.started
+        STAGE_LATENCY.observe(seconds, stage=self.name)
+        record = _current.get()
+        if record is not None:
+            spans = record["spans"]
+            spans[self.name] = spans.get(self.name, 0.0) + seconds
+        return False
+
+
+def span(name):
+    """Return a context manager timing the `name` stage."""
+    if not _settings.enabled:
+        return _NO_SPAN
+    return _Span(name)
+
+
+def traced(name=None):
+    """Decorator timing every call of the function as the `name` stage (its name by default)."""
+    def decorate(function):
+        stage = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _settings.enabled:
+                return function(*args, **kwargs)
+            with _Span(stage):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class _Request:
+    """Collects the spans of one request and emits its record on exit."""
+
+    def __init__(self, name, fields):
+        self.record = {"request": name, **fields, "spans": {}}
+        self.profiler = None
+
+    def __enter__(self):
+        if _settings.profile_dir:
+            import cProfile
+
+            self.profiler = cProfile.Profile()
+        self.token = _current.set(self.record)
+        self.started = time.perf_counter()
+        if self.profiler is not None:
+            self.profiler.enable()
+        return self.record
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        seconds = time.perf_counter() - self.started
+        if self.profiler is not None:
+            self.profiler.disable()
+            self.record["profile"] = _dump_profile(self.profiler, self.record["request"])
+        _current.reset(self.token)
+        REQUEST_TOTAL.observe(seconds, request=self.record["request"])
+        self.record.update(time=time.time(), pid=os.getpid(), seconds=seconds, error=exc_type is not None)
+        _emit(self.record)
+        return False
+
+
+def request(name, **fields):
+    """
+    Return a context manager collecting the spans of one request.
+
+    Parameters:
+    - name (str): Kind of request, e.g. "app.predict".
+    - fields: Extra values stored in the record, e.g. the model name.
+    """
+    if not _settings.enabled:
+        return _NO_SPAN
+    return _Request(name, fields)
+
+
+def _dump_profile(profiler, name):
+    # Only one request is profiled per profile_next call
+    directory, _settings.profile_dir = _settings.profile_dir, None
+    if directory is None:
+        return None
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{name}-{os.getpid()}-{time.time_ns()}.prof")
+    profiler.dump_stats(path)
+    return path
+
+
+def _emit(record):
+    with _write_lock:
+        if _settings.timing_log:
+            with open(_settings.timing_log, "a") as log_file:
+                log_file.write(json.dumps(record) + "\n")
+        if _settings.metrics_file:
+            # Written aside and renamed so scrapers never read a partial file
+            partial = f"{_settings.metrics_file}.{os.getpid()}.tmp"
+            with open(partial, "w") as metrics_file:
+                metrics_file.write(render_metrics())
+            os.replace(partial, _settings.metrics_file)
+
+
+def _configure_from_environment():
+    timing_log = os.environ.get("APP_TIMING_LOG")
+    metrics_file = os.environ.get("APP_METRICS_FILE")
+    profile_dir = os.environ.get("APP_PROFILE_DIR")
+    if timing_log or metrics_file:
+        enable(timing_log, metrics_file)
+    if profile_dir:
+        profile_next(profile_dir)
+
+
+_configure_from_environment()
+
+
+def summarize(records):
+    """
+    Return the p50/p95/p99 milliseconds and count of each stage (and of the
+    whole request, as "total") over timing records.
+    """
+    samples = {}
+    for record in records:
+        samples.setdefault("total", []).append(record["seconds"])
+        for name, seconds in record["spans"].items():
+            samples.setdefault(name, []).append(seconds)
+    summary = {}
+    for name, values in samples.items():
+        values = sorted(values)
+        summary[name] = {"count": len(values)}
+        for percentile in (50, 95, 99):
+            rank = min(len(values) - 1, int(round(percentile / 100 * (len(values) - 1))))
+            summary[name][f"p{percentile}"] = values[rank] * 1000
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize a timing log written with APP_TIMING_LOG.")
+    parser.add_argument("log", help="timing log (JSON lines)")
+    parser.add_argument("--request", help="only summarize requests of this kind, e.g. app.predict")
+    args = parser.parse_args(argv)
+
+    with open(args.log) as log_file:
+        records = [json.loads(line) for line in log_file if line.strip()]
+    if args.request:
+        records = [record for record in records if record["request"] == args.request]
+    print(f"{len(records)} requests")
+    print(f"{'stage':<20}{'count':>8}{'p50 (ms)':>12}{'p95 (ms)':>12}{'p99 (ms)':>12}")
+    for name, row in sorted(summarize(records).items(), key=lambda item: -item[1]["p50"]):
+        print(f"{name:<20}{row['count']:>8}{row['p50']:>12.3f}{row['p95']:>12.3f}{row['p99']:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
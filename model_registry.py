@@ -0,0 +1,417 @@
+"""
+Process-wide registry of the trained Y1/Y2 models.
+
+Every model is loaded once per process and then shared by all Streamlit
+sessions (and any other caller in the same process). A model is loaded from
+its compact artifact (see compact_models.py) when one exists and is at least
+as recent as the pickle, which avoids importing sklearn/xgboost; otherwise the
+pickle is unpickled. The compiled tree evaluators (see tree_compiler.py) are
+for small batches only: batches from BATCH_ROWS rows on are handed to the
+pickled original, which is loaded the first time such a batch comes in, and
+the models in PICKLE_ONLY, where compiling gains nothing, are always served
+from their pickle. When a file is rewritten on disk, e.g. after running
+run.py, the registry notices the new modification time and reloads that model
+on its next access. Trees pickled by sklearn versions before 1.4 keep leaf
+sample counts where newer versions keep class fractions, so their
+predict_proba returns counts; such models are wrapped so every caller gets
+probabilities.
+
+Cascades (see cascade.py) registered with `register_cascade` are served under
+their own name like any other model, built from the registry's models.
+
+Usage:
+    python model_registry.py            # load every model and print load stats
+"""
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+from cascade import DEFAULT_THRESHOLD, CascadeModel, cascade_name
+from compact_models import META_FILE, FormatVersionError, load_compact
+from instrumentation import span
+
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Maps the model names shown in the app to the prefix of their pickle files
+MODEL_FILES = {
+    "Logistic Regression": "logreg",
+    "XGBoost Classifier": "xgboost",
+    "Random Forest Classifier": "random_forest",
+    "Support Vector Machine": "svm",
+    "AdaBoost Classifier": "ada",
+    "Bagging Classifier": "bagging",
+    "Decision Tree": "decision_tree",
+}
+
+TARGETS = ("y1", "y2")
+
+# Directory, relative to the model directory, of the artifacts written by
+# compact_models.py
+COMPACT_DIR = "compact"
+
+# Rows from which a batch is predicted by the pickled original instead of the
+# compact model, by compact kind: where the library overtakes the compact
+# evaluator (benchmark.py compares both at each batch size)
+BATCH_ROWS = {"trees": 512, "xgboost": 32}
+
+# Models served from their pickle even when a compact artifact is up to date:
+# sklearn walks a single tree as fast as the compiled evaluator at any batch
+# size. The artifact is only used when the pickle is missing.
+PICKLE_ONLY = ("Decision Tree",)
+
+# Target key of the models trained by `run.py --multi-output` to predict both
+MULTI_OUTPUT = "multi"
+
+
+def model_path(model_choice, target, model_dir=MODEL_DIR):
+    """
+    Return the path of the pickle holding `model_choice` for `target`.
+
+    Parameters:
+    - model_choice (str): Model name as shown in the app, e.g. "Decision Tree".
+    - target (str): "y1", "y2" or MULTI_OUTPUT.
+    - model_dir (str): Directory holding the pickles.
+    """
+    return os.path.join(model_dir, f"{MODEL_FILES[model_choice]}_model_{target}.pkl")
+
+
+def compact_path(model_choice, target, model_dir=MODEL_DIR):
+    """Return the directory of the compact artifact of `model_choice` for `target`."""
+    return os.path.join(model_dir, COMPACT_DIR, f"{MODEL_FILES[model_choice]}_model_{target}")
+
+
+def _resident_bytes():
+    """Return the resident set size of this process, or None where unsupported."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+# Models whose predict_proba averages the class values of their leaves
+AVERAGED_TREE_MODELS = ("DecisionTreeClassifier", "RandomForestClassifier", "ExtraTreesClassifier",
+                        "BaggingClassifier")
+
+
+def _returns_leaf_counts(model):
+    """Return whether the predict_proba of `model` returns leaf sample counts instead of probabilities."""
+    model = getattr(model, "model", model)
+    if getattr(model, "meta", {}).get("mode") == "mean":
+        # Compact artifact, which keeps the values of the pickle it was exported from
+        value = model.arrays["value"][model.arrays["roots"][0]]
+    elif type(model).__name__ in AVERAGED_TREE_MODELS:
+        while not hasattr(model, "tree_"):
+            model = model.estimators_[0]
+        if model.tree_.n_outputs != 1:
+            return False
+        value = model.tree_.value[0, 0]
+    else:
+        return False
+    return bool(value.sum() > 1 + 1e-6)
+
+
+class NormalizedProbabilities:
+    """A model whose predict_proba rows are scaled to sum to one; the rest is delegated."""
+
+    def __init__(self, model):
+        self.model = model
+
+    def predict_proba(self, X):
+        proba = np.asarray(self.model.predict_proba(X), dtype=np.float64)
+        return proba / proba.sum(axis=1, keepdims=True)
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+
+def _batch_rows(model):
+    """Return the rows from which a batch of the compact `model` is faster on its pickle, or None."""
+    while hasattr(model, "model"):
+        model = model.model
+    # sklearn's AdaBoost walks its trees one at a time, so its compact model
+    # stays ahead at every batch size
+    if model.meta.get("mode") == "samme":
+        return None
+    return BATCH_ROWS.get(model.meta["kind"])
+
+
+class BatchRouted:
+    """
+    A compact tree model that hands batches of `batch_rows` rows or more to
+    the pickle it was exported from, loaded on the first such batch. Without
+    the pickle every batch stays on the compact model.
+    """
+
+    def __init__(self, model, pickle_path, batch_rows):
+        self.model = model
+        self.pickle_path = pickle_path
+        self.batch_rows = batch_rows
+        self._original = None
+        self._lock = threading.Lock()
+
+    def original(self):
+        """Return the pickled model, or None if there is no pickle."""
+        with self._lock:
+            if self._original is None:
+                import joblib
+
+                try:
+                    model = joblib.load(self.pickle_path)
+                except FileNotFoundError:
+                    model = self.model
+                else:
+                    if _returns_leaf_counts(model):
+                        model = NormalizedProbabilities(model)
+                self._original = model
+        return None if self._original is self.model else self._original
+
+    def _route(self, X):
+        original = self.original() if len(X) >= self.batch_rows else None
+        return self.model if original is None else original
+
+    def predict(self, X):
+        return self._route(X).predict(X)
+
+    def predict_proba(self, X):
+        return self._route(X).predict_proba(X)
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+
+class LoadedModel:
+    """A deserialized model together with what it cost to load it."""
+
+    def __init__(self, model, path, mtime, load_seconds, memory_bytes):
+        self.model = model
+        self.path = path
+        self.mtime = mtime
+        self.load_seconds = load_seconds
+        self.memory_bytes = memory_bytes
+        self.loads = 1
+
+
+class ModelRegistry:
+    """
+    Loads each model at most once and hands out the shared instance.
+
+    Parameters:
+    - model_dir (str): Directory holding the `<prefix>_model_<target>.pkl` files.
+    - prefer_compact (bool): Load compact artifacts instead of pickles when
+      they are up to date.
+    """
+
+    def __init__(self, model_dir=MODEL_DIR, prefer_compact=True):
+        self.model_dir = model_dir
+        self.prefer_compact = prefer_compact
+        self._models = {}
+        self._cascades = {}
+        self._cascade_models = {}
+        self._lock = threading.RLock()
+
+    def _source(self, model_choice, target):
+        # Returns the path to load the model from and its modification time
+        path = model_path(model_choice, target, self.model_dir)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if self.prefer_compact:
+            compact = compact_path(model_choice, target, self.model_dir)
+            try:
+                compact_mtime = os.stat(os.path.join(compact, META_FILE)).st_mtime_ns
+            except FileNotFoundError:
+                compact_mtime = None
+            # A pickle newer than its compact artifact has been retrained since the export
+            if compact_mtime is not None and (mtime is None or (compact_mtime >= mtime
+                                                                and model_choice not in PICKLE_ONLY)):
+                return compact, compact_mtime
+        if mtime is None:
+            raise FileNotFoundError(2, "No such file or directory", path)
+        return path, mtime
+
+    def _load(self, path, mtime, pickle_path):
+        before = _resident_bytes()
+        start = time.perf_counter()
+        with span("load_model"):
+            model, load_path = None, path
+            if os.path.isdir(path):
+                try:
+                    model = load_compact(path)
+                except FormatVersionError:
+                    # Exported by another version of compact_models.py: the
+                    # pickle is served until the artifact is exported again
+                    load_path = pickle_path
+            if model is None:
+                import joblib
+
+                model = joblib.load(load_path)
+            if _returns_leaf_counts(model):
+                model = NormalizedProbabilities(model)
+            batch_rows = _batch_rows(model) if load_path != pickle_path else None
+            if batch_rows is not None:
+                model = BatchRouted(model, pickle_path, batch_rows)
+        load_seconds = time.perf_counter() - start
+        after = _resident_bytes()
+        memory_bytes = after - before if before is not None and after is not None else None
+        return LoadedModel(model, path, mtime, load_seconds, memory_bytes)
+
+    def register_cascade(self, cheap, expensive, threshold=DEFAULT_THRESHOLD):
+        """
+        Serve the cascade of the `cheap` and `expensive` models (names as shown
+        in the app) and return the name it is served under.
+        """
+        name = cascade_name(cheap, expensive)
+        with self._lock:
+            self._cascades[name] = (cheap, expensive, threshold)
+            for target in TARGETS:
+                self._cascade_models.pop((name, target), None)
+        return name
+
+    def _cascade(self, name, target):
+        cheap, expensive, threshold = self._cascades[name]
+        cheap_model, expensive_model = self.get(cheap, target), self.get(expensive, target)
+        with self._lock:
+            model = self._cascade_models.get((name, target))
+            # Rebuilt when one of its models has been reloaded
+            if model is None or model.cheap is not cheap_model or model.expensive is not expensive_model:
+                model = CascadeModel(cheap_model, expensive_model, threshold)
+                self._cascade_models[(name, target)] = model
+            return model
+
+    def get(self, model_choice, target):
+        """
+        Return the fitted model for `model_choice` and `target`, loading it on
+        first use or when its pickle has changed on disk.
+
+        Raises FileNotFoundError if neither the pickle nor a compact artifact
+        exists.
+        """
+        if model_choice in self._cascades:
+            if target == MULTI_OUTPUT:
+                raise ValueError("Cascades are built from the two-target models")
+            return self._cascade(model_choice, target)
+        key = (model_choice, target)
+        path, mtime = self._source(model_choice, target)
+
+        entry = self._models.get(key)
+        if entry is not None and entry.path == path and entry.mtime == mtime:
+            return entry.model
+
+        with self._lock:
+            # Another thread may have loaded it while we waited for the lock
+            entry = self._models.get(key)
+            if entry is not None and entry.path == path and entry.mtime == mtime:
+                return entry.model
+            loaded = self._load(path, mtime, model_path(model_choice, target, self.model_dir))
+            if entry is not None:
+                loaded.loads = entry.loads + 1
+            self._models[key] = loaded
+            return loaded.model
+
+    def get_pair(self, model_choice):
+        """Return the (Y1, Y2) models for `model_choice`."""
+        return self.get(model_choice, "y1"), self.get(model_choice, "y2")
+
+    def get_models(self, model_choice, multi_output=False):
+        """
+        Return the (Y1, Y2) models for `model_choice`, or with `multi_output`
+        the single model predicting both targets.
+        """
+        if multi_output:
+            return self.get(model_choice, MULTI_OUTPUT)
+        return self.get_pair(model_choice)
+
+    def version(self, model_choice, multi_output=False):
+        """
+        Return a token identifying the files the models of `model_choice`
+        are currently loaded from, which changes whenever one is rewritten.
+        """
+        if model_choice in self._cascades:
+            cheap, expensive, threshold = self._cascades[model_choice]
+            return self.version(cheap), self.version(expensive), threshold
+        targets = (MULTI_OUTPUT,) if multi_output else TARGETS
+        return tuple(self._source(model_choice, target) for target in targets)
+
+    def predict(self, model_choice, input_data, multi_output=False):
+        """
+        Predict Y1 and Y2 for the rows of `input_data`.
+
+        With `multi_output` both targets come from a single predict call of the
+        multi-output model. Returns the (Y1, Y2) predictions.
+        """
+        models = self.get_models(model_choice, multi_output)
+        if multi_output:
+            predictions = models.predict(input_data)
+            return predictions[:, 0], predictions[:, 1]
+        return models[0].predict(input_data), models[1].predict(input_data)
+
+    def preload(self, model_choices=None):
+        """
+        Load every model up front, skipping the ones missing from disk.
+
+        Returns the list of (model_choice, target) pairs that could not be loaded.
+        """
+        missing = []
+        for model_choice in model_choices or MODEL_FILES:
+            for target in TARGETS:
+                try:
+                    self.get(model_choice, target)
+                except FileNotFoundError:
+                    missing.append((model_choice, target))
+        return missing
+
+    def cascade_stats(self):
+        """Return the escalation counters of each cascade built so far."""
+        with self._lock:
+            return [dict(model=name, target=target, **model.stats())
+                    for (name, target), model in self._cascade_models.items()]
+
+    def stats(self):
+        """
+        Return one dict per loaded model with its load time and the growth in
+        resident memory while loading it. The first model of each family also
+        pays for importing its library (sklearn, xgboost), so its numbers
+        include that one-off cost.
+        """
+        with self._lock:
+            return [
+                {
+                    "model": model_choice,
+                    "target": target,
+                    "path": entry.path,
+                    "load_seconds": entry.load_seconds,
+                    "memory_bytes": entry.memory_bytes,
+                    "loads": entry.loads,
+                }
+                for (model_choice, target), entry in self._models.items()
+            ]
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Return the registry shared by the whole process."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ModelRegistry()
+    return _registry
+
+
+if __name__ == "__main__":
+    registry = get_registry()
+    missing = registry.preload()
+    print(f"{'model':<26}{'target':<8}{'load (ms)':>12}{'memory (MB)':>14}")
+    for row in registry.stats():
+        memory = "n/a" if row["memory_bytes"] is None else f"{row['memory_bytes'] / 2**20:.2f}"
+        print(f"{row['model']:<26}{row['target']:<8}{row['load_seconds'] * 1000:>12.1f}{memory:>14}")
+    for model_choice, target in missing:
+        print(f"{model_choice:<26}{target:<8}{'missing':>12}", file=sys.stderr)
@@ -0,0 +1,190 @@
+"""
+LRU cache of Y1/Y2 predictions keyed on the encoded feature vector.
+
+The form has a small, discrete input space, so the same answer combinations
+are scored over and over. `PredictionCache` keeps the predictions (and, when
+they were asked for, the class probabilities) of recently scored rows, keyed
+on the model, the version of its files on disk and the bytes of the encoded
+row. Entries expire after `ttl` seconds and the least recently used entry is
+evicted beyond `maxsize`. Retraining a model changes its version, so stale
+predictions are never served after a reload.
+
+Usage:
+    cache = get_prediction_cache()
+    (y1, y2), probabilities = cache.predict(get_registry(), "Decision Tree", input_data)
+    cache.stats()   # {"hits": ..., "misses": ..., "evictions": ..., "size": ...}
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from instrumentation import span
+from model_registry import TARGETS
+
+DEFAULT_MAXSIZE = 4096
+DEFAULT_TTL = 3600.0
+
+
+class CachedPrediction:
+    """Predictions of one row, with the class probabilities when computed."""
+
+    __slots__ = ("labels", "probabilities", "expires")
+
+    def __init__(self, labels, probabilities, expires):
+        self.labels = labels
+        self.probabilities = probabilities
+        self.expires = expires
+
+
+class PredictionCache:
+    """
+    Thread-safe LRU cache of per-row predictions with a time-to-live.
+
+    Parameters:
+    - maxsize (int): Most rows kept; 0 disables caching.
+    - ttl (float): Seconds an entry stays valid.
+    """
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, ttl=DEFAULT_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(model_key, row):
+        """Return the cache key of one encoded row scored by the model of `model_key`."""
+        return model_key, np.ascontiguousarray(row, dtype=np.float64).tobytes()
+
+    def get(self, key, proba=False):
+        """
+        Return the CachedPrediction stored under `key`, or None when it is
+        missing, expired or lacks the probabilities asked for.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires <= time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None or (proba and entry.probabilities is None):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, labels, probabilities=None):
+        """Store the predictions of one row."""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = CachedPrediction(labels, probabilities, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return the hit, miss and eviction counters and the current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    @staticmethod
+    def model_key(registry, model_choice, multi_output=False):
+        """Return the part of the cache key identifying the model and its files."""
+        return model_choice, multi_output, registry.version(model_choice, multi_output)
+
+    def score(self, registry, model_choice, rows, proba=False, multi_output=False, model_key=None):
+        """
+        Score `rows` with one call per target, without looking them up, and
+        cache the results.
+
+        Returns one CachedPrediction per row.
+        """
+        model_key = model_key or self.model_key(registry, model_choice, multi_output)
+        models = registry.get_models(model_choice, multi_output)
+        if multi_output:
+            with span("predict"):
+                predictions = models.predict(rows)
+                labels = [predictions[:, 0], predictions[:, 1]]
+                scored = list(zip(models.predict_proba(rows), models.classes_)) if proba else None
+        else:
+            labels = []
+            scored = [] if proba else None
+            for target, model in zip(TARGETS, models):
+                with span(f"predict_{target}"):
+                    labels.append(model.predict(rows))
+                    if proba:
+                        scored.append((model.predict_proba(rows), model.classes_))
+
+        entries = []
+        for index, row in enumerate(rows):
+            row_labels = tuple(target_labels[index] for target_labels in labels)
+            row_probabilities = None
+            if scored is not None:
+                row_probabilities = tuple((target_proba[index].copy(), classes) for target_proba, classes in scored)
+            entries.append(CachedPrediction(row_labels, row_probabilities, None))
+            self.put(self.key(model_key, row), row_labels, row_probabilities)
+        return entries
+
+    def predict(self, registry, model_choice, input_data, proba=False, multi_output=False):
+        """
+        Predict Y1 and Y2 for the rows of `input_data`, scoring only the rows
+        missing from the cache.
+
+        Parameters:
+        - registry (ModelRegistry): Registry the models are taken from.
+        - model_choice (str): Model name as shown in the app.
+        - input_data (ndarray): Encoded rows, as returned by ENCODER.encode.
+        - proba (bool): Also return the class probabilities.
+        - multi_output (bool): Use the multi-output model.
+
+        Returns the (Y1, Y2) predictions and, with `proba`, a (probabilities,
+        classes) pair per target (None otherwise).
+        """
+        input_data = np.ascontiguousarray(input_data, dtype=np.float64)
+        model_key = self.model_key(registry, model_choice, multi_output)
+        entries = [self.get(self.key(model_key, row), proba) for row in input_data]
+        missing = [index for index, entry in enumerate(entries) if entry is None]
+        if missing:
+            scored = self.score(registry, model_choice, input_data[missing], proba, multi_output, model_key)
+            for index, entry in zip(missing, scored):
+                entries[index] = entry
+
+        predictions = tuple(np.array([entry.labels[position] for entry in entries]) for position in range(len(TARGETS)))
+        if not proba:
+            return predictions, None
+        probabilities = [(np.vstack([entry.probabilities[position][0] for entry in entries]),
+                          entries[0].probabilities[position][1])
+                         for position in range(len(TARGETS))]
+        return predictions, probabilities
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_prediction_cache():
+    """Return the prediction cache shared by the whole process."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = PredictionCache()
+    return _cache
@@ -1,83 +1,500 @@
+"""
+Train the Y1 and Y2 models and save them next to the app.
+
+The twelve (model, target) fits are scheduled across a process pool of at most
+one worker per fit. Each fit gets a share of the CPU cores through the
+estimator's own n_jobs, the cores left over going to the slowest fits, so the
+pool never runs more threads than there are cores, and each model is dumped
+as soon as its fit finishes. Nested joblib parallelism runs in threads, so the
+CPU time reported for each fit covers all of it.
+
+Every two-target model is also exported to the compact inference format of
+compact_models.py (skip with --no-compact), which the app loads without
+importing sklearn or xgboost.
+
+With --multi-output, each family is instead trained once on a single split to
+predict Y1 and Y2 together and saved as `<family>_model_multi.pkl`; --compare
+trains both setups and reports how they differ.
+
+--params overrides the final parameters below with the ones written by
+tune.py.
+
+Each run records, in training_state.json next to the models, the watermark
+(latest survey wave, the Timestamp column) and a fingerprint of the rows each
+model was trained on. With --incremental, only rows of waves newer than a
+model's watermark are ingested: random forests and XGBoost models get
+--new-trees more trees fitted on those rows, models with partial_fit are
+updated in place, and the other families are refitted from scratch. A model
+is refitted as well when rows up to its watermark changed since it was
+trained, or when the new rows miss one of its classes. Full fits hold out
+the seeded train_test_split of the notebook the models come from; the new
+rows of --incremental are held out by a hash of their row id (ROW_ID_COLUMN)
+instead, so a new row keeps its side from one run to the next and rows held
+out of a warm start are never trained on later.
+
+Usage:
+    python run.py                          # one worker per core
+    python run.py --workers 4 --models random_forest bagging
+    python run.py --multi-output --compare
+    python run.py --params tuned_params.json   # parameters found by tune.py
+    python run.py --incremental --new-trees 10
+"""
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
 import pandas as pd
+from sklearn.base import clone
+from sklearn.metrics import f1_score
 from sklearn.model_selection import train_test_split
+from sklearn.multioutput import MultiOutputClassifier
 from sklearn.ensemble import AdaBoostClassifier, BaggingClassifier, RandomForestClassifier
 from sklearn.tree import DecisionTreeClassifier
 from sklearn.svm import SVC
 from xgboost import XGBClassifier
 import joblib
 
-# Load the dataset
-df = pd.read_csv(r'C:\Users\Lenovo\Desktop\ML App\final.csv')
+import dataset
+from compact_models import export_model
+from model_registry import COMPACT_DIR
+from survey_schema import TARGET_COLUMNS
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'final.csv')
+
+# Models with the final parameters, listed from the slowest to the fastest fit
+# so the longest jobs start first
+MODEL_SPECS = {
+    'bagging': (BaggingClassifier, {'estimator': RandomForestClassifier(n_estimators=100, random_state=42),
+                                    'n_estimators': 50, 'random_state': 42}),
+    'ada': (AdaBoostClassifier, {'n_estimators': 180, 'learning_rate': 0.201, 'random_state': 0}),
+    'svm': (SVC, {'kernel': 'rbf', 'gamma': 0.0001, 'C': 100, 'probability': True}),
+    'random_forest': (RandomForestClassifier, {'n_estimators': 35, 'max_depth': 26, 'random_state': 10}),
+    'xgboost': (XGBClassifier, {'n_estimators': 35, 'max_depth': 26}),
+    'decision_tree': (DecisionTreeClassifier, {'criterion': 'gini', 'max_depth': 150, 'random_state': 0}),
+}
+
+# Target key of the models predicting Y1 and Y2 together
+MULTI_OUTPUT = 'multi'
+
+# Families whose estimator fits both targets natively; the others are wrapped
+# in a MultiOutputClassifier so they still take one fit and one predict call
+NATIVE_MULTI_OUTPUT = ('random_forest', 'decision_tree')
+
+# Survey wave of each row; rows of waves newer than a model's watermark are
+# the ones --incremental ingests
+WATERMARK_COLUMN = 'Timestamp'
+
+# Training state of the models, written next to them
+STATE_FILE = 'training_state.json'
+
+# Share of the rows held out as the test split
+TEST_SIZE = 0.2
+
+# Row id of final.csv (its unnamed index column), which --incremental splits
+# the new rows by
+ROW_ID_COLUMN = 'Unnamed: 0'
+
+# Families whose fitted models can grow more trees on new rows
+WARM_START_FAMILIES = ('random_forest', 'xgboost')
+
+
+def load_data(path=DATA_PATH):
+    """
+    Load the dataset from its columnar cache (see dataset.py) and return the
+    features and both targets. The columns keep their survey question names,
+    which the fitted models expect.
+
+    Returns:
+    - X (DataFrame): Model inputs.
+    - targets (dict): Maps "y1" and "y2" to their target Series.
+    """
+    df = dataset.load_dataset(path)
+    X = df.drop(columns=list(TARGET_COLUMNS.values()) + [ROW_ID_COLUMN])
+    targets = {target: df[column] for target, column in TARGET_COLUMNS.items()}
+    return X, targets
+
+
+def split_data(X, y, row_ids=None):
+    """
+    Split the data into training and testing sets.
+
+    Parameters:
+    - X (DataFrame): Model inputs.
+    - y (Series or DataFrame): Labels.
+    - row_ids (Series): Row ids of X. When given, each row goes to the test
+      split by a hash of its id instead of the seeded shuffle, so rows keep
+      their side when new survey waves are added (used by --incremental).
+    """
+    if row_ids is None:
+        return train_test_split(X, y, test_size=TEST_SIZE, random_state=25)
+    test = pd.util.hash_pandas_object(row_ids, index=False).to_numpy() % 1000 < TEST_SIZE * 1000
+    return X[~test], X[test], y[~test], y[test]
+
+
+def load_row_ids(path=DATA_PATH):
+    """Return the id of each row of the dataset, aligned with load_data."""
+    return dataset.load_dataset(path, columns=[ROW_ID_COLUMN])[ROW_ID_COLUMN]
+
+
+def target_values(targets, target):
+    """Return the labels of `target`, both targets as columns for MULTI_OUTPUT."""
+    if target == MULTI_OUTPUT:
+        return pd.DataFrame(targets)
+    return targets[target]
+
+
+def data_fingerprint(X, targets, watermark):
+    """Return a hash of the rows (features and targets) up to `watermark`."""
+    rows = pd.concat([X, pd.DataFrame(targets)], axis=1)
+    rows = rows[rows[WATERMARK_COLUMN] <= watermark]
+    return hashlib.sha256(pd.util.hash_pandas_object(rows, index=False).to_numpy().tobytes()).hexdigest()
+
+
+def load_state(output_dir):
+    """Return the training state of the models in `output_dir`, keyed by file name."""
+    try:
+        with open(os.path.join(output_dir, STATE_FILE)) as state_file:
+            return json.load(state_file)['models']
+    except FileNotFoundError:
+        return {}
+
+
+def save_state(output_dir, results, X, targets):
+    """Record the watermark and data fingerprint of each model in `results`."""
+    state = load_state(output_dir)
+    watermark = int(X[WATERMARK_COLUMN].max())
+    fingerprint = data_fingerprint(X, targets, watermark)
+    trained_at = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds')
+    for result in results:
+        state[os.path.basename(result['path'])] = {
+            'family': result['family'],
+            'target': result['target'],
+            'watermark': watermark,
+            'fingerprint': fingerprint,
+            'rows': len(X),
+            'mode': result.get('mode', 'refit'),
+            'trained_at': trained_at,
+        }
+    path = os.path.join(output_dir, STATE_FILE)
+    with open(f'{path}.tmp', 'w') as state_file:
+        json.dump({'watermark_column': WATERMARK_COLUMN, 'models': state}, state_file, indent=2)
+    os.replace(f'{path}.tmp', path)
+
+
+def build_model(family, n_jobs=1, multi_output=False, params=None):
+    """
+    Create an unfitted model of `family` with its final parameters.
+
+    Parameters:
+    - family (str): Key of MODEL_SPECS.
+    - n_jobs (int): Threads the estimator may use, for the estimators that
+      support it.
+    - multi_output (bool): Build a model predicting Y1 and Y2 together.
+    - params (dict): Parameters overriding the final ones, nested ones
+      included (e.g. "estimator__max_depth").
+    """
+    model_class, final_params = MODEL_SPECS[family]
+    # Clone so nested estimators are not shared with MODEL_SPECS
+    model = clone(model_class(**final_params))
+    if params:
+        model.set_params(**params)
+    if family == 'bagging':
+        # Parallelise over the bagged forests, not inside each of them
+        model.set_params(n_jobs=n_jobs, estimator__n_jobs=1)
+    elif 'n_jobs' in model.get_params():
+        model.set_params(n_jobs=n_jobs)
+    if multi_output and family not in NATIVE_MULTI_OUTPUT:
+        model = MultiOutputClassifier(model)
+    return model
+
+
+def model_filename(family, target):
+    return f'{family}_model_{target}.pkl'
+
+
+def load_params(path):
+    """Return the tuned parameters of each family from a tune.py result file."""
+    with open(path) as params_file:
+        tuned = json.load(params_file)
+    return {family: result['params'] for family, result in tuned['families'].items()}
+
+
+def job_threads(n_jobs, cpus, workers):
+    """
+    Return the n_jobs of each of `n_jobs` fits, listed slowest first, run by
+    `workers` workers on `cpus` cores. The first fits, which start together,
+    share the cores, the slowest of them getting the cores left over; the
+    later ones start as a fit finishes and get the smallest share. With more
+    workers than cores every fit gets one thread.
+    """
+    share, spare = divmod(cpus, workers)
+    return [max(1, share + (index < spare)) for index in range(n_jobs)]
+
+
+def _fit_in_threads():
+    # Bagging parallelises with joblib, whose default backend runs worker
+    # processes: their CPU time is missing from time.process_time and they
+    # nest a second process pool inside the training pool. Threads avoid both;
+    # the tree fits release the GIL.
+    return joblib.parallel_config(backend='threading')
+
+
+_worker_data = {}
+
+
+def _init_worker(data_path):
+    # Load the dataset once per worker process instead of once per fit
+    _worker_data['data'] = load_data(data_path)
+
+
+def train_model(family, target, n_jobs, output_dir, data_path=DATA_PATH, compact=True, params=None):
+    """
+    Fit one model on the training split of `target` (or of both targets for
+    MULTI_OUTPUT) and dump it, also as a compact artifact unless `compact` is
+    False. `params` overrides the final parameters of the family.
+
+    Returns a dict with the wall-clock and CPU seconds spent fitting.
+    """
+    if 'data' not in _worker_data:
+        _init_worker(data_path)
+    X, targets = _worker_data['data']
+    X_train, X_test, y_train, y_test = split_data(X, target_values(targets, target))
+
+    model = build_model(family, n_jobs, multi_output=target == MULTI_OUTPUT, params=params)
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    with _fit_in_threads():
+        model.fit(X_train, y_train)
+    wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+
+    path = os.path.join(output_dir, model_filename(family, target))
+    joblib.dump(model, path)
+    if compact and target != MULTI_OUTPUT:
+        export_model(model, os.path.join(output_dir, COMPACT_DIR, f'{family}_model_{target}'))
+    return {'family': family, 'target': target, 'wall': wall, 'cpu': cpu, 'path': path}
+
+
+def train_all(families=None, workers=None, output_dir='.', data_path=DATA_PATH, multi_output=False,
+              compact=True, params=None, jobs=None):
+    """
+    Train every (family, target) pair across a pool of `workers` processes.
+
+    Parameters:
+    - families (list): Keys of MODEL_SPECS to train, all of them by default.
+    - workers (int): Worker processes, one per CPU core by default and at
+      most one per (family, target) pair.
+    - output_dir (str): Directory the pickles are written to.
+    - data_path (str): CSV the models are trained on.
+    - multi_output (bool): Train one model per family for both targets.
+    - compact (bool): Also export each model to the compact format.
+    - params (dict): Maps families to parameters overriding their final ones.
+    - jobs (list): (family, target) pairs to train instead of every target of
+      `families`.
+
+    The watermark and data fingerprint of every trained model are recorded
+    with save_state. Returns the per-model timings in completion order.
+    """
+    model_targets = [MULTI_OUTPUT] if multi_output else list(TARGET_COLUMNS)
+    jobs = jobs or [(family, target) for family in families or MODEL_SPECS for target in model_targets]
+    # Slowest first (MODEL_SPECS order), so the longest fits start first and
+    # get the spare cores
+    order = list(MODEL_SPECS)
+    jobs = sorted(jobs, key=lambda job: order.index(job[0]))
+    params = params or {}
+    cpus = os.cpu_count() or 1
+    workers = min(workers or cpus, len(jobs))
+    threads = job_threads(len(jobs), cpus, workers)
+
+    # Build the dataset cache once, before the workers all read it
+    dataset.ensure_cache(data_path)
+    results = []
+    if workers == 1:
+        for (family, target), n_jobs in zip(jobs, threads):
+            results.append(train_model(family, target, n_jobs, output_dir, data_path, compact, params.get(family)))
+            print(f"Saved {results[-1]['path']} ({results[-1]['wall']:.1f}s)", flush=True)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(data_path,)) as pool:
+            futures = [pool.submit(train_model, family, target, n_jobs, output_dir, data_path, compact,
+                                   params.get(family))
+                       for (family, target), n_jobs in zip(jobs, threads)]
+            for future in as_completed(futures):
+                results.append(future.result())
+                print(f"Saved {results[-1]['path']} ({results[-1]['wall']:.1f}s)", flush=True)
+    save_state(output_dir, results, *load_data(data_path))
+    return results
+
+
+def warm_start(model, family, X_new, y_new, new_trees, n_jobs=1):
+    """
+    Update a fitted model with new rows only.
 
-# Prepare the data for training
-X = df.drop(columns=['Would you feel comfortable discussing a mental health issue with your coworkers?',
-                     'Would you feel comfortable discussing a mental health issue with your direct supervisor(s)?',
-                     'Unnamed: 0'], axis=1)
+    Parameters:
+    - model: Fitted model of `family`.
+    - family (str): Key of MODEL_SPECS.
+    - X_new (DataFrame): New training rows.
+    - y_new (Series): Their labels.
+    - new_trees (int): Trees (boosting rounds for XGBoost) fitted on the new rows.
+    - n_jobs (int): Threads the estimator may use.
 
-Y1 = df['Would you feel comfortable discussing a mental health issue with your coworkers?']
-Y2 = df['Would you feel comfortable discussing a mental health issue with your direct supervisor(s)?']
+    Returns the updated model, or None when it has to be refitted instead.
+    """
+    if hasattr(model, 'partial_fit'):
+        model.partial_fit(X_new, y_new)
+        return model
+    # The added trees must see every class of the model, or their outputs
+    # would not line up with those of the existing trees
+    if family not in WARM_START_FAMILIES or not np.array_equal(np.unique(y_new), model.classes_):
+        return None
+    if family == 'random_forest':
+        model.set_params(warm_start=True, n_estimators=model.n_estimators + new_trees, n_jobs=n_jobs)
+        model.fit(X_new, y_new)
+        model.set_params(warm_start=False)
+        return model
+    # XGBoost continues boosting from the existing booster
+    updated = XGBClassifier(**dict(model.get_params(), n_estimators=new_trees, n_jobs=n_jobs))
+    updated.fit(X_new, y_new, xgb_model=model.get_booster())
+    updated.set_params(n_estimators=model.n_estimators + new_trees)
+    return updated
 
-# Split the data into training and testing sets
-X_train_1, X_test_1, y1_train, y1_test = train_test_split(X, Y1, test_size=0.2, random_state=25)
-X_train_2, X_test_2, y2_train, y2_test = train_test_split(X, Y2, test_size=0.2, random_state=25)
 
-# Define the models with the final parameters
-xgboost_model_y1 = XGBClassifier(**{'n_estimators': 35, 'max_depth': 26})
-xgboost_model_y2 = XGBClassifier(**{'n_estimators': 35, 'max_depth': 26})
+def train_incremental(families=None, workers=None, output_dir='.', data_path=DATA_PATH, compact=True,
+                      params=None, new_trees=10):
+    """
+    Bring the two-target models up to date with the rows newer than their
+    watermark, warm-starting the models that support it and refitting the
+    others.
 
-random_forest_model_y1 = RandomForestClassifier(**{'n_estimators': 35, 'max_depth': 26, 'random_state': 10})
-random_forest_model_y2 = RandomForestClassifier(**{'n_estimators': 35, 'max_depth': 26, 'random_state': 10})
+    Parameters are those of train_all, plus:
+    - new_trees (int): Trees added to a warm-started forest or booster.
 
-svm_model_y1 = SVC(**{'kernel': 'rbf', 'gamma': 0.0001, 'C': 100, 'probability': True})
-svm_model_y2 = SVC(**{'kernel': 'rbf', 'gamma': 0.0001, 'C': 100, 'probability': True})
+    Returns the per-model timings of the models that were updated.
+    """
+    X, targets = load_data(data_path)
+    row_ids = load_row_ids(data_path)
+    state = load_state(output_dir)
+    n_jobs = os.cpu_count() or 1
+    results, refit = [], []
+    for family in families or MODEL_SPECS:
+        for target in TARGET_COLUMNS:
+            path = os.path.join(output_dir, model_filename(family, target))
+            entry = state.get(model_filename(family, target))
+            if (entry is None or not os.path.exists(path)
+                    or data_fingerprint(X, targets, entry['watermark']) != entry['fingerprint']):
+                refit.append((family, target))
+                continue
+            X_train, _, y_train, _ = split_data(X, targets[target], row_ids)
+            new = X_train[WATERMARK_COLUMN] > entry['watermark']
+            if not new.any():
+                print(f"{path} is up to date (watermark {entry['watermark']})")
+                continue
 
-ada_model_y1 = AdaBoostClassifier(**{'n_estimators': 180, 'learning_rate': 0.201, 'random_state': 0})
-ada_model_y2 = AdaBoostClassifier(**{'n_estimators': 180, 'learning_rate': 0.201, 'random_state': 0})
+            wall_start, cpu_start = time.perf_counter(), time.process_time()
+            with _fit_in_threads():
+                model = warm_start(joblib.load(path), family, X_train[new], y_train[new], new_trees, n_jobs)
+            if model is None:
+                refit.append((family, target))
+                continue
+            wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+            joblib.dump(model, path)
+            if compact:
+                export_model(model, os.path.join(output_dir, COMPACT_DIR, f'{family}_model_{target}'))
+            results.append({'family': family, 'target': target, 'wall': wall, 'cpu': cpu, 'path': path,
+                            'mode': 'warm_start'})
+            print(f"Updated {path} with {int(new.sum())} new rows ({wall:.1f}s)", flush=True)
 
-bagging_model_y1 = BaggingClassifier(**{'estimator': RandomForestClassifier(n_estimators=100, random_state=42),
-                                         'n_estimators': 50, 'random_state': 42})
-bagging_model_y2 = BaggingClassifier(**{'estimator': RandomForestClassifier(n_estimators=100, random_state=42),
-                                         'n_estimators': 50, 'random_state': 42})
+    save_state(output_dir, results, X, targets)
+    if refit:
+        results += train_all(workers=workers, output_dir=output_dir, data_path=data_path, compact=compact,
+                             params=params, jobs=refit)
+    return results
 
-decision_tree_model_y1 = DecisionTreeClassifier(**{'criterion': 'gini', 'max_depth': 150, 'random_state': 0})
-decision_tree_model_y2 = DecisionTreeClassifier(**{'criterion': 'gini', 'max_depth': 150, 'random_state': 0})
 
-# Train the models
-xgboost_model_y1.fit(X_train_1, y1_train)
-xgboost_model_y2.fit(X_train_2, y2_train)
+def print_summary(results, elapsed):
+    print(f"\n{'model':<16}{'target':<8}{'mode':<12}{'wall (s)':>10}{'cpu (s)':>10}")
+    for result in sorted(results, key=lambda result: result['wall'], reverse=True):
+        print(f"{result['family']:<16}{result['target']:<8}{result.get('mode', 'refit'):<12}"
+              f"{result['wall']:>10.2f}{result['cpu']:>10.2f}")
+    print(f"{'total':<36}{elapsed:>10.2f}{sum(result['cpu'] for result in results):>10.2f}")
 
-random_forest_model_y1.fit(X_train_1, y1_train)
-random_forest_model_y2.fit(X_train_2, y2_train)
 
-svm_model_y1.fit(X_train_1, y1_train)
-svm_model_y2.fit(X_train_2, y2_train)
+def compare_multi_output(results, families=None, output_dir='.', data_path=DATA_PATH):
+    """
+    Compare the two-model and multi-output setups of each family on the test
+    split: fit time, inference time for both targets, size on disk and F1.
 
-ada_model_y1.fit(X_train_1, y1_train)
-ada_model_y2.fit(X_train_2, y2_train)
+    Parameters:
+    - results (list): Timings returned by train_all for both setups.
+    - families (list): Keys of MODEL_SPECS to compare, all of them by default.
+    - output_dir (str): Directory holding the pickles of both setups.
+    - data_path (str): CSV the models were trained on.
+    """
+    X, targets = load_data(data_path)
+    X_train, X_test, Y_train, Y_test = split_data(X, target_values(targets, MULTI_OUTPUT))
+    fit_times = {(result['family'], result['target']): result['wall'] for result in results}
 
-bagging_model_y1.fit(X_train_1, y1_train)
-bagging_model_y2.fit(X_train_2, y2_train)
+    print(f"\n{'model':<16}{'setup':<8}{'fit (s)':>9}{'predict (ms)':>14}{'size (KB)':>11}{'F1 y1':>8}{'F1 y2':>8}")
+    for family in families or MODEL_SPECS:
+        for setup, model_targets in (('two', list(TARGET_COLUMNS)), (MULTI_OUTPUT, [MULTI_OUTPUT])):
+            paths = [os.path.join(output_dir, model_filename(family, target)) for target in model_targets]
+            models = [joblib.load(path) for path in paths]
 
-decision_tree_model_y1.fit(X_train_1, y1_train)
-decision_tree_model_y2.fit(X_train_2, y2_train)
+            start = time.perf_counter()
+            predictions = [model.predict(X_test) for model in models]
+            predict_ms = (time.perf_counter() - start) * 1000
+            if setup == MULTI_OUTPUT:
+                predictions = [predictions[0][:, 0], predictions[0][:, 1]]
 
-# Save the models
-joblib.dump(xgboost_model_y1, 'xgboost_model_y1.pkl')
-joblib.dump(xgboost_model_y2, 'xgboost_model_y2.pkl')
+            fit = sum(fit_times.get((family, target), float('nan')) for target in model_targets)
+            size_kb = sum(os.path.getsize(path) for path in paths) / 1024
+            f1 = [f1_score(Y_test[target], prediction, average='weighted')
+                  for target, prediction in zip(TARGET_COLUMNS, predictions)]
+            print(f"{family:<16}{setup:<8}{fit:>9.2f}{predict_ms:>14.1f}{size_kb:>11.0f}{f1[0]:>8.4f}{f1[1]:>8.4f}")
 
-joblib.dump(random_forest_model_y1, 'random_forest_model_y1.pkl')
-joblib.dump(random_forest_model_y2, 'random_forest_model_y2.pkl')
 
-joblib.dump(svm_model_y1, 'svm_model_y1.pkl')
-joblib.dump(svm_model_y2, 'svm_model_y2.pkl')
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the Y1 and Y2 models.")
+    parser.add_argument('--data', default=DATA_PATH, help="training CSV (default: final.csv)")
+    parser.add_argument('--workers', type=int, help="worker processes (default: one per CPU core)")
+    parser.add_argument('--models', nargs='+', choices=list(MODEL_SPECS), help="model families to train")
+    parser.add_argument('--output-dir', default='.', help="directory the models are saved to")
+    parser.add_argument('--multi-output', action='store_true',
+                        help="train one model per family predicting Y1 and Y2 together")
+    parser.add_argument('--compare', action='store_true',
+                        help="train both the two-model and multi-output setups and compare them")
+    parser.add_argument('--no-compact', dest='compact', action='store_false',
+                        help="do not export the compact inference artifacts")
+    parser.add_argument('--params', help="tune.py result file whose parameters override the final ones")
+    parser.add_argument('--incremental', action='store_true',
+                        help="only ingest rows newer than each model's watermark, warm-starting where possible")
+    parser.add_argument('--new-trees', type=int, default=10,
+                        help="trees added to warm-started random forests and XGBoost models (default: 10)")
+    args = parser.parse_args(argv)
+    if args.incremental and (args.multi_output or args.compare):
+        parser.error("--incremental only updates the two-target models")
 
-joblib.dump(ada_model_y1, 'ada_model_y1.pkl')
-joblib.dump(ada_model_y2, 'ada_model_y2.pkl')
+    params = load_params(args.params) if args.params else None
+    start = time.perf_counter()
+    if args.incremental:
+        results = train_incremental(args.models, args.workers, args.output_dir, args.data, args.compact, params,
+                                    args.new_trees)
+        print_summary(results, time.perf_counter() - start)
+        print("Models are up to date!")
+        return
 
-joblib.dump(bagging_model_y1, 'bagging_model_y1.pkl')
-joblib.dump(bagging_model_y2, 'bagging_model_y2.pkl')
+    results = train_all(args.models, args.workers, args.output_dir, args.data, args.multi_output, args.compact,
+                        params)
+    if args.compare:
+        results += train_all(args.models, args.workers, args.output_dir, args.data, not args.multi_output,
+                             args.compact, params)
+    print_summary(results, time.perf_counter() - start)
+    if args.compare:
+        compare_multi_output(results, args.models, args.output_dir, args.data)
+    print("Training completed and models saved!")
 
-joblib.dump(decision_tree_model_y1, 'decision_tree_model_y1.pkl')
-joblib.dump(decision_tree_model_y2, 'decision_tree_model_y2.pkl')
 
-print("Training completed and models saved!")
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,362 @@
+"""
+HTTP inference service for the Y1/Y2 models.
+
+A small asyncio HTTP/1.1 server (JSON in, JSON out, standard library only)
+serving the same models as the app, for callers that cannot drive the
+Streamlit UI. Models are preloaded at start-up. Concurrent requests for the
+same model are coalesced: the first request of a batch waits at most
+--batch-window-ms for others to arrive, then the whole batch is encoded and
+scored with one predict call per target. Answer combinations seen recently
+are answered straight from a prediction cache (see prediction_cache.py).
+Cascades given with --cascade (see cascade.py) are served as extra models
+that escalate only low-confidence rows to their expensive model.
+
+Endpoints:
+    POST /predict   {"model": "Decision Tree", "answers": {"age": "25-29", ...}, "proba": false}
+                    or {"model": ..., "features": [52 numbers in training column order]}
+                    -> {"model": ..., "y1": 1, "y2": 0}
+    GET  /models    models that can be served
+    GET  /metrics   Prometheus text format latency and batch size histograms, cache counters and,
+                    with --stage-metrics, stage histograms (model load, predict per target, see
+                    instrumentation.py)
+    GET  /healthz   liveness check
+
+Usage:
+    python serve.py --port 8000 --batch-window-ms 2 --max-batch 256
+    python serve.py --stage-metrics
+    python serve.py --cascade "Logistic Regression" "Support Vector Machine" --cascade-threshold 0.8
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from http import HTTPStatus
+
+import numpy as np
+
+import instrumentation
+from cascade import DEFAULT_THRESHOLD
+from feature_encoder import ENCODER
+from instrumentation import LATENCY_BUCKETS, Histogram
+from model_registry import MODEL_FILES, TARGETS, get_registry
+from prediction_cache import DEFAULT_MAXSIZE, DEFAULT_TTL, PredictionCache
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+MAX_BODY_BYTES = 1 << 20
+
+REQUEST_LATENCY = Histogram("request_latency_seconds", "Time to answer an HTTP request.", LATENCY_BUCKETS)
+PREDICT_LATENCY = Histogram("predict_latency_seconds", "Time to encode and score one batch.", LATENCY_BUCKETS)
+BATCH_SIZE = Histogram("predict_batch_size", "Requests coalesced into one predict call.", BATCH_SIZE_BUCKETS)
+
+
+class RequestError(Exception):
+    """A client error, answered with `status` and the message."""
+
+    def __init__(self, message, status=HTTPStatus.BAD_REQUEST):
+        super().__init__(message)
+        self.status = status
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent prediction requests for one model into batches.
+
+    Parameters:
+    - model_choice (str): Model name as shown in the app.
+    - window (float): Seconds the first request of a batch waits for others.
+    - max_batch (int): Largest number of requests scored together.
+    - cache (PredictionCache): Cache the predictions are stored in.
+    - multi_output (bool): Score with the multi-output model.
+    """
+
+    def __init__(self, model_choice, window, max_batch, cache, multi_output=False):
+        self.model_choice = model_choice
+        self.window = window
+        self.max_batch = max_batch
+        self.cache = cache
+        self.multi_output = multi_output
+        self._queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, features, proba):
+        """Queue one encoded row and wait for its CachedPrediction."""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((features, proba, future))
+        return await future
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.window
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            features = np.vstack([row for row, _, _ in batch])
+            proba = any(wants_proba for _, wants_proba, _ in batch)
+            started = time.perf_counter()
+            try:
+                # Scoring runs in a thread so the event loop keeps accepting requests
+                entries = await loop.run_in_executor(None, self.cache.score, get_registry(), self.model_choice,
+                                                     features, proba, self.multi_output)
+            except Exception as error:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+            PREDICT_LATENCY.observe(time.perf_counter() - started, model=self.model_choice)
+            BATCH_SIZE.observe(len(batch), model=self.model_choice)
+
+            for (_, _, future), entry in zip(batch, entries):
+                if not future.done():
+                    future.set_result(entry)
+
+
+def content_length(headers):
+    """Return the body length announced by request `headers`, raising RequestError if it is invalid."""
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        raise RequestError("Content-Length must be a number")
+    if length < 0:
+        raise RequestError("Content-Length must not be negative")
+    if length > MAX_BODY_BYTES:
+        raise RequestError(f"Request body is larger than {MAX_BODY_BYTES} bytes", HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+    return length
+
+
+def prediction_result(entry, proba=False):
+    """Return the JSON-ready predictions of a CachedPrediction."""
+    result = {target: label.item() for target, label in zip(TARGETS, entry.labels)}
+    if proba:
+        for target, (target_proba, classes) in zip(TARGETS, entry.probabilities):
+            result[f"proba_{target}"] = {str(label): float(value) for label, value in zip(classes, target_proba)}
+    return result
+
+
+class InferenceService:
+    """
+    Routes HTTP requests to the micro-batchers of the served models.
+
+    Parameters:
+    - models (list): Model names to serve.
+    - window (float): Micro-batching window in seconds.
+    - max_batch (int): Largest micro-batch.
+    - cache (PredictionCache): Cache answering repeated requests.
+    - multi_output (bool): Serve the multi-output models.
+    """
+
+    def __init__(self, models, window, max_batch, cache, multi_output=False):
+        self.models = models
+        self.window = window
+        self.max_batch = max_batch
+        self.cache = cache
+        self.multi_output = multi_output
+        self._batchers = {}
+
+    def _batcher(self, model_choice):
+        if model_choice not in self._batchers:
+            self._batchers[model_choice] = MicroBatcher(model_choice, self.window, self.max_batch, self.cache,
+                                                        self.multi_output)
+        return self._batchers[model_choice]
+
+    async def predict(self, body):
+        try:
+            request = json.loads(body)
+        except ValueError:
+            raise RequestError("Request body is not valid JSON")
+        if not isinstance(request, dict):
+            raise RequestError("Request body must be a JSON object")
+        model_choice = request.get("model", "Logistic Regression")
+        if model_choice not in self.models:
+            raise RequestError(f"Unknown model {model_choice!r}, expected one of {self.models}")
+
+        if "features" in request:
+            try:
+                features = np.asarray(request["features"], dtype=np.float64).reshape(1, -1)
+            except (TypeError, ValueError):
+                raise RequestError("'features' must be a list of numbers")
+            if features.shape[1] != len(ENCODER.columns):
+                raise RequestError(f"'features' must hold {len(ENCODER.columns)} values")
+        elif isinstance(request.get("answers"), dict):
+            answers = request["answers"]
+            invalid = [name for name, value in answers.items()
+                       if value is not None and not isinstance(value, (str, int, float))]
+            if invalid:
+                raise RequestError(f"'answers' values must be strings, numbers or null, which {invalid} are not")
+            try:
+                features = ENCODER.encode(answers)
+            except (TypeError, ValueError, KeyError) as error:
+                raise RequestError(f"Invalid 'answers': {error}")
+        else:
+            raise RequestError("Request needs an 'answers' object or a 'features' list")
+
+        proba = bool(request.get("proba"))
+        # Repeated answers are served from the cache without waiting for a batch
+        model_key = self.cache.model_key(get_registry(), model_choice, self.multi_output)
+        entry = self.cache.get(self.cache.key(model_key, features[0]), proba)
+        if entry is None:
+            entry = await self._batcher(model_choice).submit(features, proba)
+        return dict(model=model_choice, **prediction_result(entry, proba))
+
+    def cache_metrics(self):
+        """Render the prediction cache and cascade counters in the Prometheus text format."""
+        stats = self.cache.stats()
+        lines = []
+        for name in ("hits", "misses", "evictions"):
+            lines += [f"# TYPE prediction_cache_{name}_total counter", f"prediction_cache_{name}_total {stats[name]}"]
+        lines += ["# TYPE prediction_cache_size gauge", f"prediction_cache_size {stats['size']}"]
+        cascades = get_registry().cascade_stats()
+        if cascades:
+            lines += ["# TYPE cascade_rows_total counter", "# TYPE cascade_escalated_total counter"]
+            for row in cascades:
+                labels = f'model="{row["model"]}",target="{row["target"]}"'
+                lines += [f"cascade_rows_total{{{labels}}} {row['rows']}",
+                          f"cascade_escalated_total{{{labels}}} {row['escalated']}"]
+        return "\n".join(lines) + "\n"
+
+    async def handle(self, method, path, body):
+        """Return the (status, content type, payload) answering a request."""
+        if path == "/predict":
+            if method != "POST":
+                raise RequestError("Use POST", HTTPStatus.METHOD_NOT_ALLOWED)
+            return HTTPStatus.OK, "application/json", json.dumps(await self.predict(body))
+        if method != "GET":
+            raise RequestError("Use GET", HTTPStatus.METHOD_NOT_ALLOWED)
+        if path == "/metrics":
+            return HTTPStatus.OK, "text/plain; version=0.0.4", instrumentation.render_metrics() + self.cache_metrics()
+        if path == "/models":
+            return HTTPStatus.OK, "application/json", json.dumps({"models": self.models})
+        if path == "/healthz":
+            return HTTPStatus.OK, "application/json", json.dumps({"status": "ok"})
+        raise RequestError(f"No route for {path}", HTTPStatus.NOT_FOUND)
+
+    async def serve_connection(self, reader, writer):
+        """Answer the requests of one keep-alive connection."""
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                started = time.perf_counter()
+                request_line, *header_lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = request_line.split(" ", 2)
+                except ValueError:
+                    break
+                headers = {}
+                for line in header_lines:
+                    if ":" in line:
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+                path = target.split("?", 1)[0]
+
+                # The connection is closed after a request whose body could not be read
+                body_read = False
+                try:
+                    length = content_length(headers)
+                    body = await reader.readexactly(length) if length else b""
+                    body_read = True
+                    status, content_type, payload = await self.handle(method, path, body)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except RequestError as error:
+                    status, content_type, payload = error.status, "application/json", json.dumps({"error": str(error)})
+                except FileNotFoundError as error:
+                    status, content_type = HTTPStatus.SERVICE_UNAVAILABLE, "application/json"
+                    payload = json.dumps({"error": f"Model file {error.filename} is missing"})
+                except Exception:
+                    logger.exception("Failed to answer %s %s", method, path)
+                    status, content_type = HTTPStatus.INTERNAL_SERVER_ERROR, "application/json"
+                    payload = json.dumps({"error": "Internal server error"})
+
+                keep_alive = (body_read and headers.get("connection", "").lower() != "close"
+                              and version.strip().upper() != "HTTP/1.0")
+                data = payload.encode()
+                writer.write(
+                    f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+                REQUEST_LATENCY.observe(time.perf_counter() - started, path=path)
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+
+
+async def run_server(host, port, models, window, max_batch, cache, multi_output=False, stage_metrics=False):
+    if stage_metrics:
+        # Stage timings are served on /metrics
+        instrumentation.enable()
+    registry = get_registry()
+    missing = set()
+    for model_choice in models:
+        try:
+            registry.get_models(model_choice, multi_output)
+        except FileNotFoundError:
+            missing.add(model_choice)
+    if missing:
+        logger.warning("Not serving %s: model files are missing", ", ".join(sorted(missing)))
+    service = InferenceService([model for model in models if model not in missing], window, max_batch, cache,
+                               multi_output)
+    server = await asyncio.start_server(service.serve_connection, host, port)
+    logger.info("Serving %s on http://%s:%s", ", ".join(service.models), host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the Y1/Y2 models over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--models", nargs="+", choices=list(MODEL_FILES), default=list(MODEL_FILES),
+                        help="models to preload and serve (default: all)")
+    parser.add_argument("--batch-window-ms", type=float, default=2.0,
+                        help="how long a request waits for others to share its predict call")
+    parser.add_argument("--max-batch", type=int, default=256, help="largest micro-batch")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_MAXSIZE,
+                        help="answer combinations whose predictions are cached (0 disables the cache)")
+    parser.add_argument("--cache-ttl", type=float, default=DEFAULT_TTL, help="seconds a cached prediction stays valid")
+    parser.add_argument("--multi-output", action="store_true",
+                        help="serve the multi-output models trained by run.py --multi-output")
+    parser.add_argument("--cascade", nargs=2, action="append", default=[], metavar=("CHEAP", "EXPENSIVE"),
+                        help="also serve the cascade of these two models (repeatable)")
+    parser.add_argument("--cascade-threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="cheap model confidence from which cascades do not escalate (default: %(default)s)")
+    parser.add_argument("--stage-metrics", action="store_true",
+                        help="time the stages of each prediction (model load, predict per target) for /metrics")
+    args = parser.parse_args(argv)
+    if args.cascade and args.multi_output:
+        parser.error("cascades are built from the two-target models")
+    for cheap, expensive in args.cascade:
+        if cheap not in MODEL_FILES or expensive not in MODEL_FILES:
+            parser.error(f"--cascade takes two of: {', '.join(MODEL_FILES)}")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    models = list(args.models)
+    for cheap, expensive in args.cascade:
+        models.append(get_registry().register_cascade(cheap, expensive, args.cascade_threshold))
+    cache = PredictionCache(args.cache_size, args.cache_ttl)
+    asyncio.run(run_server(args.host, args.port, models, args.batch_window_ms / 1000, args.max_batch, cache,
+                           args.multi_output, args.stage_metrics))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+"""
+Reduced-footprint variants of the Y1/Y2 models.
+
+For each model family and target, starting from the model run.py trains (with
+its final parameters, or the ones given with --params), this:
+
+1. ranks the input columns by importance: the impurity-based
+   feature_importances_ of the model where it has them, permutation
+   importance otherwise,
+2. keeps the fewest top-ranked columns (1, 2, 3, 4, 6, 8, ... of them) whose
+   model still scores within --tolerance of the model on every column,
+3. shrinks the model on those columns one capacity parameter at a time
+   (number of trees, depth; see SHRINK_SPACE) to the smallest value still
+   within --tolerance,
+4. checks the resulting slim model once more: it is only saved when both its
+   cross-validated F1 and its F1 on the test split are within --tolerance of
+   the full model's. A rejected model is reported as such and any slim model
+   saved for it before is removed, so the full model stays the one served.
+
+Every decision is scored by the weighted F1 (as in run.py) cross-validated on
+the run.py training split. Besides the final check, the test split is only
+used for the report: the full model, the model on the kept columns and the
+final slim model are refitted on the whole training split and compared on the
+test split by F1, accuracy, pickle and compact artifact size, and single-row
+and batch latency of the compact artifact the app would load.
+
+Slim models are pipelines whose first step selects the kept columns, so they
+take the same 52 encoded columns as the full models. They are saved with their
+compact artifacts to --output-dir, under the names of the full models, so the
+registry and benchmark.py can load them from there, and the report is written
+to slim_report.json next to them.
+
+Usage:
+    python slim.py                                    # every family, F1 within 0.01
+    python slim.py --models random_forest xgboost --tolerance 0.005
+    python benchmark.py --model-dir slim --models random_forest
+"""
+import argparse
+import datetime
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import joblib
+import numpy as np
+from sklearn.compose import ColumnTransformer
+from sklearn.inspection import permutation_importance
+from sklearn.metrics import accuracy_score, f1_score
+from sklearn.model_selection import KFold, cross_val_score, train_test_split
+from sklearn.pipeline import Pipeline
+
+import dataset
+import run
+from compact_models import export_model, load_compact
+from model_registry import COMPACT_DIR
+from survey_schema import TARGET_COLUMNS
+
+REPORT_FILE = 'slim_report.json'
+
+# Numbers of top-ranked columns tried, fewest first
+SUBSET_SIZES = (1, 2, 3, 4, 6, 8, 12, 16, 24, 32)
+
+# Capacity parameters of each family, shrunk in this order. Only values below
+# the one the family is trained with are tried, smallest first.
+SHRINK_SPACE = {
+    'bagging': {'n_estimators': [50, 20, 10, 5], 'estimator__n_estimators': [100, 50, 20, 10, 5],
+                'estimator__max_depth': [None, 16, 8, 6, 4]},
+    'ada': {'n_estimators': [180, 100, 50, 25, 10, 5]},
+    'svm': {},
+    'random_forest': {'n_estimators': [35, 20, 10, 5, 3], 'max_depth': [26, 12, 8, 6, 4, 3]},
+    'xgboost': {'n_estimators': [35, 20, 10, 5], 'max_depth': [26, 8, 6, 4, 3, 2]},
+    'decision_tree': {'max_depth': [150, 16, 12, 8, 6, 4, 3, 2]},
+}
+
+
+def select_columns(model, columns):
+    """Return a pipeline feeding only the input columns at `columns` to `model`."""
+    selector = ColumnTransformer([('keep', 'passthrough', [int(column) for column in columns])], remainder='drop')
+    return Pipeline([('columns', selector), ('model', model)])
+
+
+def rank_features(model, X_val, y_val, seed=0):
+    """
+    Return the input column indices of a fitted model, most important first.
+
+    Parameters:
+    - model: Fitted model.
+    - X_val (ndarray): Validation rows, used by permutation importance.
+    - y_val (Series): Validation labels.
+    - seed (int): Seed of the permutations.
+    """
+    importances = getattr(model, 'feature_importances_', None)
+    if importances is None:
+        importances = permutation_importance(model, X_val, y_val, scoring='f1_weighted', n_repeats=5,
+                                             random_state=seed).importances_mean
+    # Stable, so ties keep the training column order
+    return np.argsort(-np.asarray(importances), kind='stable')
+
+
+def _smaller(values, current):
+    # Values of a capacity parameter below the current one, None meaning unbounded
+    bound = float('inf') if current is None else current
+    return sorted((value for value in values if value is not None and value < bound))
+
+
+def _score(family, params, columns, n_jobs, X_train, y_train, folds):
+    # Mean weighted F1 over the cross-validation folds of the training split
+    model = select_columns(run.build_model(family, n_jobs, params=params), columns)
+    cv = KFold(folds, shuffle=True, random_state=25)
+    return cross_val_score(model, X_train, y_train, scoring='f1_weighted', cv=cv).mean()
+
+
+def _size_bytes(model):
+    buffer = io.BytesIO()
+    joblib.dump(model, buffer)
+    return buffer.tell()
+
+
+def _directory_bytes(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def measure(model, X_train, y_train, X_test, y_test, latency_samples=200):
+    """
+    Fit `model` on the training split and measure it on the test split.
+
+    Returns the fitted model and a dict with its F1, accuracy, pickle and
+    compact artifact sizes, and the single-row p50 latency and batch
+    throughput of its compact artifact.
+    """
+    model.fit(X_train, y_train)
+    predictions = model.predict(X_test)
+    result = {
+        'f1': f1_score(y_test, predictions, average='weighted'),
+        'accuracy': accuracy_score(y_test, predictions),
+        'pickle_bytes': _size_bytes(model),
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        export_model(model, directory)
+        result['compact_bytes'] = _directory_bytes(directory)
+        compact = load_compact(directory, mmap=False)
+        rows = X_test[np.arange(latency_samples) % len(X_test)]
+        compact.predict(rows[:1])
+        samples = []
+        for index in range(latency_samples):
+            start = time.perf_counter()
+            compact.predict(rows[index:index + 1])
+            samples.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        compact.predict(X_test)
+        batch_seconds = time.perf_counter() - start
+    result['latency_ms_p50'] = float(np.percentile(samples, 50) * 1000)
+    result['rows_per_second'] = len(X_test) / batch_seconds
+    return model, result
+
+
+def slim_model(family, target, n_jobs=1, data_path=run.DATA_PATH, tolerance=0.01, params=None,
+               output_dir='slim', folds=5):
+    """
+    Find, fit, save and measure the slim variant of one model.
+
+    Parameters:
+    - family (str): Key of run.MODEL_SPECS.
+    - target (str): "y1" or "y2".
+    - n_jobs (int): Threads each fit may use.
+    - data_path (str): Training CSV.
+    - tolerance (float): Largest drop of the cross-validated (and test) F1 accepted.
+    - params (dict): Parameters overriding the family's final ones.
+    - output_dir (str): Directory the slim model is saved to.
+    - folds (int): Cross-validation folds every candidate is scored on.
+
+    Returns a dict with the kept columns, the shrunk parameters, the
+    measurements of the full, column-pruned and slim variants and whether the
+    slim model was accepted and saved (its path, None when rejected).
+    """
+    X, targets = run.load_data(data_path)
+    names = list(X.columns)
+    X_train, X_test, y_train, y_test = run.split_data(X, targets[target])
+    # The app feeds encoded NumPy rows, which the slim pipelines are fitted on
+    X_train, X_test = X_train.to_numpy(dtype=np.float64), X_test.to_numpy(dtype=np.float64)
+    training = (X_train, y_train, folds)
+    params = dict(params or {})
+    all_columns = np.arange(len(names))
+
+    # Ranked on a held-out part of the training split, for permutation importance
+    X_fit, X_val, y_fit, y_val = train_test_split(X_train, y_train, test_size=0.25, random_state=25)
+    ranking = rank_features(run.build_model(family, n_jobs, params=params).fit(X_fit, y_fit), X_val, y_val)
+    reference = _score(family, params, all_columns, n_jobs, *training)
+
+    columns = all_columns
+    for size in SUBSET_SIZES:
+        if size >= len(names):
+            break
+        if _score(family, params, ranking[:size], n_jobs, *training) >= reference - tolerance:
+            columns = np.sort(ranking[:size])
+            break
+
+    model_params = run.build_model(family, params=params).get_params()
+    shrunk = {}
+    for name, values in SHRINK_SPACE[family].items():
+        for value in _smaller(values, model_params[name]):
+            candidate = dict(params, **shrunk, **{name: value})
+            if _score(family, candidate, columns, n_jobs, *training) >= reference - tolerance:
+                shrunk[name] = value
+                break
+
+    # Every step was scored on its own, against noisy folds: the combination
+    # is scored again before it may replace the full model
+    slim_cv_f1 = _score(family, dict(params, **shrunk), columns, n_jobs, *training)
+
+    variants = {}
+    for variant, variant_columns, variant_params in (('full', all_columns, params),
+                                                     ('columns', columns, params),
+                                                     ('slim', columns, dict(params, **shrunk))):
+        model = select_columns(run.build_model(family, n_jobs, params=variant_params), variant_columns)
+        model, variants[variant] = measure(model, X_train, y_train, X_test, y_test)
+        variants[variant]['columns'] = len(variant_columns)
+
+    accepted = (slim_cv_f1 >= reference - tolerance
+                and variants['slim']['f1'] >= variants['full']['f1'] - tolerance)
+    path = os.path.join(output_dir, run.model_filename(family, target))
+    compact = os.path.join(output_dir, COMPACT_DIR, f'{family}_model_{target}')
+    if accepted:
+        joblib.dump(model, path)
+        export_model(model, compact)
+    else:
+        # A slim model saved by an earlier run would still be served
+        if os.path.exists(path):
+            os.remove(path)
+        shutil.rmtree(compact, ignore_errors=True)
+    return {
+        'family': family,
+        'target': target,
+        'cv_f1': reference,
+        'slim_cv_f1': slim_cv_f1,
+        'columns': [names[column] for column in columns],
+        'shrunk_params': shrunk,
+        'variants': variants,
+        'accepted': accepted,
+        'path': path if accepted else None,
+    }
+
+
+def slim_all(families=None, workers=None, data_path=run.DATA_PATH, tolerance=0.01, params=None,
+             output_dir='slim', folds=5):
+    """
+    Slim every (family, target) pair across a pool of `workers` processes and
+    return the results in completion order.
+    """
+    cpus = os.cpu_count() or 1
+    workers = workers or cpus
+    n_jobs = max(1, cpus // workers)
+    jobs = [(family, target) for family in families or run.MODEL_SPECS for target in TARGET_COLUMNS]
+    params = params or {}
+    os.makedirs(output_dir, exist_ok=True)
+    dataset.ensure_cache(data_path)
+
+    results = []
+    if workers == 1:
+        for family, target in jobs:
+            results.append(slim_model(family, target, n_jobs, data_path, tolerance, params.get(family), output_dir,
+                                      folds))
+            print(_format_result(results[-1]), flush=True)
+        return results
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(slim_model, family, target, n_jobs, data_path, tolerance, params.get(family),
+                               output_dir, folds)
+                   for family, target in jobs]
+        for future in as_completed(futures):
+            results.append(future.result())
+            print(_format_result(results[-1]), flush=True)
+    return results
+
+
+def _format_result(result):
+    shrunk = ', '.join(f'{name}={value}' for name, value in result['shrunk_params'].items()) or 'unchanged'
+    if not result['accepted']:
+        variants = result['variants']
+        return (f"Rejected {result['family']} {result['target']}: {len(result['columns'])} columns, {shrunk} "
+                f"(cv F1 {result['slim_cv_f1']:.4f} vs {result['cv_f1']:.4f}, "
+                f"test F1 {variants['slim']['f1']:.4f} vs {variants['full']['f1']:.4f})")
+    return f"Saved {result['path']}: {len(result['columns'])} columns, {shrunk}"
+
+
+def print_report(results):
+    print(f"\n{'model':<16}{'target':<8}{'variant':<9}{'columns':>8}{'F1':>8}{'accuracy':>10}{'pickle (KB)':>13}"
+          f"{'compact (KB)':>14}{'p50 (ms)':>10}{'rows/s':>11}")
+    for result in sorted(results, key=lambda result: (result['family'], result['target'])):
+        for variant, row in result['variants'].items():
+            flag = '  rejected' if variant == 'slim' and not result['accepted'] else ''
+            print(f"{result['family']:<16}{result['target']:<8}{variant:<9}{row['columns']:>8}{row['f1']:>8.4f}"
+                  f"{row['accuracy']:>10.4f}{row['pickle_bytes'] / 1024:>13.0f}{row['compact_bytes'] / 1024:>14.0f}"
+                  f"{row['latency_ms_p50']:>10.3f}{row['rows_per_second']:>11,.0f}{flag}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train reduced-footprint variants of the Y1 and Y2 models.")
+    parser.add_argument('--data', default=run.DATA_PATH, help="training CSV (default: final.csv)")
+    parser.add_argument('--models', nargs='+', choices=list(run.MODEL_SPECS), help="model families to slim")
+    parser.add_argument('--workers', type=int, help="worker processes (default: one per CPU core)")
+    parser.add_argument('--tolerance', type=float, default=0.01,
+                        help="largest drop of the cross-validated F1 accepted (default: 0.01)")
+    parser.add_argument('--folds', type=int, default=5, help="cross-validation folds (default: 5)")
+    parser.add_argument('--params', help="tune.py result file whose parameters override the final ones")
+    parser.add_argument('--output-dir', default='slim', help="directory the slim models are saved to")
+    args = parser.parse_args(argv)
+
+    params = run.load_params(args.params) if args.params else None
+    results = slim_all(args.models, args.workers, args.data, args.tolerance, params, args.output_dir, args.folds)
+    print_report(results)
+    report = {
+        'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'tolerance': args.tolerance,
+        'folds': args.folds,
+        'results': results,
+    }
+    with open(os.path.join(args.output_dir, REPORT_FILE), 'w') as report_file:
+        json.dump(report, report_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Start-up timings of the Streamlit app.
+
+app.py imports this module before any other module of the app and records,
+once per process:
+
+- deferred_imports: seconds the first Predict click spends importing the
+  encoder, the model registry and the prediction cache (NumPy included),
+  which app.py defers until then,
+- first_render: seconds from the start of the first script run to the end
+  of the first full page render,
+- first_prediction: seconds spent handling the first Predict click
+  (encoding, model loading, prediction and display).
+
+Each timing is logged and, when the APP_STARTUP_LOG environment variable
+names a file, appended to it as a JSON line so regressions can be tracked.
+
+Usage:
+    python startup_timing.py --model "Decision Tree"   # measure a cold start
+"""
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+# When app.py first started running in this process
+STARTED = time.perf_counter()
+
+_timings = {}
+
+
+def record(name, seconds):
+    """Record the `name` timing unless this process already has one."""
+    if name in _timings:
+        return
+    _timings[name] = seconds
+    logger.info("startup %s: %.3fs", name, seconds)
+    log_path = os.environ.get("APP_STARTUP_LOG")
+    if log_path:
+        with open(log_path, "a") as log_file:
+            log_file.write(json.dumps({"pid": os.getpid(), "time": time.time(), "name": name,
+                                       "seconds": seconds}) + "\n")
+
+
+def since_start():
+    """Seconds since app.py first started running in this process."""
+    return time.perf_counter() - STARTED
+
+
+def timings():
+    """Return the timings recorded so far by this process."""
+    return dict(_timings)
+
+
+# Runs app.py in a fresh interpreter, clicks Predict and prints the timings
+_COLD_START_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import startup_timing
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file(sys.argv[1], default_timeout=600)
+app.run()
+app.sidebar.selectbox[0].select(sys.argv[2]).run()
+app.button[0].click().run()
+print(json.dumps(dict(startup_timing.timings(), total=time.perf_counter() - started)))
+"""
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure a cold start of the app.")
+    parser.add_argument("--model", default="Logistic Regression", help="model selected before predicting")
+    args = parser.parse_args(argv)
+
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    output = subprocess.run([sys.executable, "-c", _COLD_START_SCRIPT, os.path.join(app_dir, "app.py"), args.model],
+                            cwd=app_dir, check=True, capture_output=True, text=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    for name, seconds in result.items():
+        print(f"{name:<18}{seconds:>8.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Survey schema shared by the app, the encoder and the training code.
+
+Plain Python tables only, so the app can lay out its form without importing
+NumPy or pandas.
+"""
+
+# Answer choices of the app form and the code each one is encoded to
+ANSWER_CODES = {
+    "age": {"18-24": 0, "25-29": 1, "30-34": 2, "35-39": 3, "40-44": 4, "45-49": 5, "50-54": 6, "55-59": 7,
+            "60-64": 8, "65-69": 9, "70-74": 10, "75-79": 11, "80-84": 12, "85-89": 13, "90-94": 14, "95-99": 15},
+    "gender": {"Male": 0, "Female": 1, "Non-Binary": 2, "Prefer not to say": 3, "Other": 4},
+    "country": {
+        "United States of America": 6,
+        "Brazil": 51,
+        "Italy": 23,
+        "Canada": 52,
+        "Germany": 16,
+        "India": 52,
+        "Belarus": 16,
+        "Macedonia": 51,
+        "Slovenia": 52,
+        "Albania": 52,
+        "Austria": 51,
+        "Kenya": 52,
+        "Australia": 17,
+        "Sao Tome and Principe": 52,
+        "Vietnam": 52,
+        "Indonesia": 52,
+        "Switzerland": 47,
+        "Finland": 45,
+        "Turkey": 52,
+        "Poland": 52,
+        "United Kingdom": 52,
+        "Nigeria": 6,
+        "Bulgaria": 5,
+        "Estonia": 39,
+        "Colombia": 45,
+        "Netherlands": 52,
+        "Israel": 52,
+        "Bangladesh": 52,
+        "Greece": 52,
+        "China": 52,
+        "South Africa": 21,
+        "Portugal": 51,
+        "Pakistan": 52
+    },
+    "num_employees": {"1-10": 0, "11-50": 1, "51-100": 2, "101-250": 3, "251-500": 4, "500+": 5},
+    "mental_health_benefits": {"Yes": 1, "No": 0, "Don't Know": 2},
+    "anonymity_protected": {"Yes": 1, "No": 0, "Don't Know": 2},
+    "sought_treatment": {"Yes": 1, "No": 0},
+    "diagnosed_condition": {"Yes": 1, "No": 0, "Prefer not to say": 2},
+    "physical_health_discussion": {"Yes": 1, "No": 0, "Maybe": 2},
+    "mental_health_discussion": {"Yes": 1, "No": 0, "Maybe": 2},
+    "discuss_with_coworkers": {"Yes": 1, "No": 0, "Maybe": 2},
+    "interference_treated": {"Rarely": 0, "Sometimes": 1, "Often": 2, "Always": 3},
+    "interference_not_treated": {"Rarely": 0, "Sometimes": 1, "Often": 2, "Always": 3},
+    "remote_work": {"Yes": 1, "No": 0},
+}
+
+# Code of a country that is not in ANSWER_CODES["country"]
+UNKNOWN_COUNTRY_CODE = 99
+
+# Code of the labels missing from ANSWER_CODES, for the answers that accept
+# free text. Unknown labels of the other answers are rejected.
+UNKNOWN_CODES = {"country": UNKNOWN_COUNTRY_CODE}
+
+# Model input columns in the order run.py trains on (final.csv without the
+# index and the two targets). Each entry is (column, answer, default): the
+# form answer feeding the column, or None for the columns the app does not ask
+# about, and the value used when the answer is missing (for answered columns,
+# the code of the choice the app form preselects). The app has always
+# filled the model input positionally, so the answer feeding a column is not
+# necessarily the one its question suggests; changing that changes what the
+# shipped models predict. Inputs keyed by the question itself are decoded with
+# the codes of that question (see QUESTION_ANSWERS), not of the answer.
+FEATURE_TABLE = [
+    ("Timestamp", None, 0.0),
+    ("Are you openly identified at work as a person with a mental health issue?", None, 0.0),
+    ("Are you self-employed?", "mental_health_discussion", 1.0),
+    ("Did you ever discuss your mental health with a previous coworker(s)?", "mental_health_discussion", 1.0),
+    ("Did you ever discuss your mental health with your previous employer?", None, 0.0),
+    ("Did you ever have a previous coworker discuss their or another coworker's mental health with you?", None, 1.0),
+    ("Did your previous employers ever formally discuss mental health (as part of a wellness campaign or other official communication)?", None, 0.0),
+    ("Did your previous employers provide resources to learn more about mental health disorders and how to seek help?", "diagnosed_condition", 1.0),
+    ("Do you currently have a mental health disorder?", None, 1.0),
+    ("Do you have a family history of mental illness?", None, 1.0),
+    ("Do you have previous employers?", None, 1.0),
+    ("Do you know the options for mental health care available under your employer-provided health coverage?", None, 1.0),
+    ("Does your employer offer resources to learn more about mental health disorders and options for seeking help?", "mental_health_benefits", 1.0),
+    ("Does your employer provide mental health benefits as part of healthcare coverage?", None, 0.0),
+    ("Has your employer ever formally discussed mental health (for example, as part of a wellness campaign or other official communication)?", "mental_health_discussion", 1.0),
+    ("Have you ever discussed your mental health with coworkers?", "mental_health_discussion", 1.0),
+    ("Have you ever discussed your mental health with your employer?", None, 0.0),
+    ("Have you ever had a coworker discuss their or another coworker's mental health with you?", "sought_treatment", 1.0),
+    ("Have you ever sought treatment for a mental health disorder from a mental health professional?", None, 1.0),
+    ("Have you had a mental health disorder in the past?", None, 1.0),
+    ("Have you observed or experienced a supportive or well handled response to a mental health issue in your current or previous workplace?", None, 1.0),
+    ("Have you observed or experienced an unsupportive or badly handled response to a mental health issue in your current or previous workplace?", None, 0.0),
+    ("Have your observations of how another individual who discussed a mental health issue made you less likely to reveal a mental health issue yourself in your current workplace?", "mental_health_benefits", 1.0),
+    ("Have your previous employers provided mental health benefits?", "num_employees", 0.0),
+    ("How many employees does your company or organization have?", "discuss_with_coworkers", 1.0),
+    ("How willing would you be to share with friends and family that you have a mental illness?", None, 4.0),
+    ("If a mental health issue prompted you to request a medical leave from work, how easy or difficult would it be to ask for that leave?", None, 5.0),
+    ("If they knew you suffered from a mental health disorder, how do you think that your team members/co-workers would react?", "interference_not_treated", 0.0),
+    ("If you have a mental health disorder, how often do you feel that it interferes with your work when NOT being treated effectively (i.e., when you are experiencing symptoms)?", "interference_treated", 0.0),
+    ("If you have a mental health disorder, how often do you feel that it interferes with your work when being treated effectively?", "physical_health_discussion", 1.0),
+    ("Is your anonymity protected if you choose to take advantage of mental health or substance abuse treatment resources provided by your employer?", None, 1.0),
+    ("Is your employer primarily a tech company/organization?", None, 1.0),
+    ("Is your primary role within your company related to tech/IT?", None, 4.0),
+    ("Overall, how much importance did your previous employer place on mental health?", "physical_health_discussion", 1.0),
+    ("Overall, how much importance did your previous employer place on physical health?", None, 5.0),
+    ("Overall, how much importance does your employer place on mental health?", "physical_health_discussion", 1.0),
+    ("Overall, how much importance does your employer place on physical health?", None, 3.0),
+    ("Overall, how well do you think the tech industry supports employees with mental health issues?", "anonymity_protected", 1.0),
+    ("Was your anonymity protected if you chose to take advantage of mental health or substance abuse treatment resources with previous employers?", None, 1.0),
+    ("Was your employer primarily a tech company/organization?", None, 1.0),
+    ("Were you aware of the options for mental health care provided by your previous employers?", "country", UNKNOWN_COUNTRY_CODE),
+    ("What country do you live in?", "country", UNKNOWN_COUNTRY_CODE),
+    ("What country do you work in?", "age", 0.0),
+    ("What is your age?", "gender", 0.0),
+    ("What is your gender?", "physical_health_discussion", 1.0),
+    ("What is your race?", None, 0.0),
+    ("Would you be willing to bring up a physical health issue with a potential employer in an interview?", None, 1.0),
+    ("Would you bring up your mental health with a potential employer in an interview?", None, 1.0),
+    ("Would you feel more comfortable talking to your coworkers about your physical health or your mental health?", "physical_health_discussion", 1.0),
+    ("Would you have been willing to discuss your mental health with your coworkers at previous employers?", "discuss_with_coworkers", 1.0),
+    ("Would you have been willing to discuss your mental health with your direct supervisor(s)?", "discuss_with_coworkers", 1.0),
+    ("Would you have felt more comfortable talking to your previous employer about your physical health or your mental health?", "physical_health_discussion", 1.0),
+]
+
+# Answer of ANSWER_CODES that each survey question asks, for the questions the
+# form has. Labels keyed by a question are decoded with these codes, whichever
+# answer the app feeds the question's column.
+QUESTION_ANSWERS = {
+    "Does your employer provide mental health benefits as part of healthcare coverage?": "mental_health_benefits",
+    "Have you ever sought treatment for a mental health disorder from a mental health professional?": "sought_treatment",
+    "How many employees does your company or organization have?": "num_employees",
+    "If you have a mental health disorder, how often do you feel that it interferes with your work when NOT being treated effectively (i.e., when you are experiencing symptoms)?": "interference_not_treated",
+    "If you have a mental health disorder, how often do you feel that it interferes with your work when being treated effectively?": "interference_treated",
+    "Is your anonymity protected if you choose to take advantage of mental health or substance abuse treatment resources provided by your employer?": "anonymity_protected",
+    "What country do you live in?": "country",
+    "What country do you work in?": "country",
+    "What is your age?": "age",
+    "What is your gender?": "gender",
+}
+
+# The two targets of final.csv, keyed by the name used throughout the project
+TARGET_COLUMNS = {
+    "y1": "Would you feel comfortable discussing a mental health issue with your coworkers?",
+    "y2": "Would you feel comfortable discussing a mental health issue with your direct supervisor(s)?",
+}
@@ -0,0 +1,84 @@
+"""
+Parity of the shared feature encoder with the input vector the app built by
+hand before it (the baseline app.py), for every answer option of the form.
+
+Usage:
+    python -m pytest test_feature_encoder.py
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from feature_encoder import ENCODER
+from survey_schema import ANSWER_CODES, UNKNOWN_COUNTRY_CODE
+
+
+def baseline_input(answers):
+    """The (1, 52) input_data of the baseline app for form answers keyed by answer name."""
+    encoded = {answer: codes[answers[answer]] for answer, codes in ANSWER_CODES.items() if answer != "country"}
+    country = ANSWER_CODES["country"].get(answers["country"], UNKNOWN_COUNTRY_CODE)
+    mental_health_discussion = encoded["mental_health_discussion"]
+    physical_health_discussion = encoded["physical_health_discussion"]
+    discuss_with_coworkers = encoded["discuss_with_coworkers"]
+    return np.array([
+        0.0, 0.0, mental_health_discussion, mental_health_discussion, 0.0, 1.0, 0.0,
+        encoded["diagnosed_condition"], 1.0, 1.0, 1.0, 1.0, encoded["mental_health_benefits"], 0.0,
+        mental_health_discussion, mental_health_discussion, 0.0, encoded["sought_treatment"], 1.0, 1.0, 1.0, 0.0,
+        encoded["mental_health_benefits"], encoded["num_employees"], discuss_with_coworkers, 4.0, 5.0,
+        encoded["interference_not_treated"], encoded["interference_treated"], physical_health_discussion, 1.0,
+        1.0, 4.0, physical_health_discussion, 5.0, physical_health_discussion, 3.0,
+        encoded["anonymity_protected"], 1.0, 1.0, country, country, encoded["age"], encoded["gender"],
+        physical_health_discussion, 0.0, 1.0, 1.0, physical_health_discussion, discuss_with_coworkers,
+        discuss_with_coworkers, physical_health_discussion,
+    ], dtype=np.float64).reshape(1, -1)
+
+
+# The answers the app form preselects
+DEFAULT_ANSWERS = {answer: next(iter(codes)) for answer, codes in ANSWER_CODES.items()}
+
+ANSWER_OPTIONS = [(answer, label) for answer, codes in ANSWER_CODES.items() for label in codes]
+
+
+@pytest.mark.parametrize("answer, label", ANSWER_OPTIONS)
+def test_every_answer_option_matches_baseline(answer, label):
+    answers = dict(DEFAULT_ANSWERS, **{answer: label})
+    np.testing.assert_array_equal(ENCODER.encode(answers), baseline_input(answers))
+
+
+def test_batch_matches_baseline():
+    records = [dict(DEFAULT_ANSWERS, **{answer: label}) for answer, label in ANSWER_OPTIONS]
+    expected = np.vstack([baseline_input(record) for record in records])
+    np.testing.assert_array_equal(ENCODER.encode(records), expected)
+    np.testing.assert_array_equal(ENCODER.encode(pd.DataFrame.from_records(records)), expected)
+
+
+def test_unknown_country_is_encoded_as_unknown():
+    answers = dict(DEFAULT_ANSWERS, country="Atlantis")
+    np.testing.assert_array_equal(ENCODER.encode(answers), baseline_input(answers))
+    assert ENCODER.encode([answers])[0, ENCODER.columns.index("What country do you live in?")] == UNKNOWN_COUNTRY_CODE
+
+
+@pytest.mark.parametrize("question, answer", [
+    ("What is your age?", "age"),
+    ("What is your gender?", "gender"),
+    ("What country do you live in?", "country"),
+    ("How many employees does your company or organization have?", "num_employees"),
+])
+def test_labels_keyed_by_question_use_its_codes(question, answer):
+    index = ENCODER.columns.index(question)
+    labels = list(ANSWER_CODES[answer])
+    for label in labels:
+        assert ENCODER.encode({question: label})[0, index] == ANSWER_CODES[answer][label]
+    column = ENCODER.encode(pd.DataFrame({question: labels}))[:, index]
+    np.testing.assert_array_equal(column, [ANSWER_CODES[answer][label] for label in labels])
+
+
+@pytest.mark.parametrize("data", [
+    {"age": "Banana"},
+    {"What is your race?": "Yes"},
+    [{"gender": "Unknown"}],
+    pd.DataFrame({"What is your age?": ["25-29", "Banana"]}),
+])
+def test_unknown_labels_are_rejected(data):
+    with pytest.raises(ValueError):
+        ENCODER.encode(data)
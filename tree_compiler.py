@@ -0,0 +1,222 @@
+"""
+Compiled, vectorized evaluation of tree ensembles.
+
+`compile_model` turns a fitted decision tree, random forest, bagged forest,
+AdaBoost over trees or XGBoost classifier into a single packed node array:
+the nodes of every tree concatenated, children stored as absolute indices and
+every leaf its own left and right child (the layout compact_models.py also
+stores on disk, so loaded artifacts are walked straight from the mapped
+pages).
+
+`apply_trees` walks all the trees of such an array for a whole batch at once.
+Every (row, tree) pair moves down one level per NumPy step, so a forest costs
+about as many NumPy calls as its depth, instead of depth times the number of
+trees; the pairs that reached a leaf are dropped once they are the majority.
+`accumulate` then adds the per-tree outputs one at a time in the order sklearn
+and XGBoost add them, which keeps predictions (and the sklearn probabilities)
+bit-identical to the original models.
+
+The compiled path is for single rows and small batches only. There it avoids
+the per-call overhead of sklearn and XGBoost, which walk the trees in C: on a
+forest a single-row predict drops from about 2.3 ms to 0.3 ms. On large batches
+the libraries are faster, from about 500 rows for the random forest and 30
+rows for XGBoost (`python tree_compiler.py` times both on final.csv), so the
+registry hands such batches to the pickles, and a single decision tree gains
+nothing at any size, so it is not served compiled (see model_registry.py).
+
+Usage:
+    python tree_compiler.py                               # verify the tree models next to the app on final.csv
+    python tree_compiler.py --models bagging xgboost --data export.csv
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+# Marks a leaf in the child arrays of sklearn and XGBoost trees
+LEAF = -1
+
+# (row, tree) pairs walked at once, which bounds the temporary arrays
+CHUNK_PAIRS = 1 << 16
+
+
+def apply_trees(X, feature, threshold, left, right, roots, default_left=None, strict=False):
+    """
+    Return the leaf reached by every row of `X` in each tree, shape
+    (n_rows, n_trees).
+
+    Parameters:
+    - X (ndarray): Input rows, float32 as the trees were fitted on.
+    - feature, left, right (ndarray): Packed node arrays, every leaf being its
+      own left and right child, so a step leaves the pairs at a leaf in place.
+    - threshold (ndarray): Split threshold of each node.
+    - roots (ndarray): Index of the root node of each tree.
+    - default_left (ndarray): Side missing values go to (XGBoost only).
+    - strict (bool): Send `x < threshold` left as XGBoost does, instead of
+      sklearn's `x <= threshold`.
+    """
+    X = np.ascontiguousarray(X)
+    n_rows, n_features = X.shape
+    n_trees = len(roots)
+    leaves = np.empty((n_rows, n_trees), dtype=np.intp)
+    chunk = max(1, CHUNK_PAIRS // max(n_trees, 1))
+    for start in range(0, n_rows, chunk):
+        stop = min(start + chunk, n_rows)
+        flat_X = X[start:stop].ravel()
+        # One entry per (row, tree) pair, row-major
+        node = np.tile(np.asarray(roots, dtype=np.intp), stop - start)
+        offset = np.repeat(np.arange(stop - start, dtype=np.intp) * n_features, n_trees)
+        # Indices of the pairs still moving, or None while that is all of them
+        active = None
+        while True:
+            current = node if active is None else node[active]
+            values = flat_X.take((offset if active is None else offset[active]) + feature.take(current))
+            split = threshold.take(current)
+            go_left = values < split if strict else values <= split
+            if default_left is not None:
+                go_left = np.where(np.isnan(values), default_left.take(current), go_left)
+            current = np.where(go_left, left.take(current), right.take(current))
+            moving = left.take(current) != current
+            if active is None:
+                node = current
+            else:
+                node[active] = current
+            n_moving = np.count_nonzero(moving)
+            if not n_moving:
+                break
+            # Keep stepping every pair while most are still moving, which
+            # avoids the gathers of shrinking the active set each level
+            if n_moving <= moving.size // 2:
+                active = np.flatnonzero(moving) if active is None else active[moving]
+        leaves[start:stop] = node.reshape(stop - start, n_trees)
+    return leaves
+
+
+def accumulate(terms, initial=None):
+    """
+    Sum `terms` over axis 1 one term at a time, in order, as a Python loop
+    adding them to `initial` would. Unlike `sum`, whose pairwise summation
+    rounds differently, this reproduces the originals' results bit for bit.
+
+    Parameters:
+    - terms (ndarray): Shape (n_rows, n_terms, ...).
+    - initial (ndarray): Starting value of shape (n_rows, ...), or None.
+    """
+    if initial is not None:
+        terms = np.concatenate([initial[:, np.newaxis], terms], axis=1)
+    if terms.shape[1] == 0:
+        return np.zeros((terms.shape[0],) + terms.shape[2:], dtype=terms.dtype)
+    return np.cumsum(terms, axis=1, dtype=terms.dtype)[:, -1]
+
+
+# Compiling and verifying fitted models (needs sklearn/xgboost)
+
+TREE_MODELS = ("DecisionTreeClassifier", "RandomForestClassifier", "ExtraTreesClassifier", "BaggingClassifier",
+               "AdaBoostClassifier")
+
+
+def compile_model(model):
+    """
+    Compile a fitted tree model into an in-memory compact model evaluated with
+    `apply_trees`.
+
+    Raises ValueError for models that are not tree ensembles.
+    """
+    from compact_models import TreeModel, XGBoostModel, _tree_arrays, _xgboost_arrays
+
+    name = type(model).__name__
+    if name == "XGBClassifier":
+        meta, arrays = _xgboost_arrays(model)
+        return XGBoostModel(dict(meta, kind="xgboost"), arrays)
+    if name not in TREE_MODELS:
+        raise ValueError(f"{name} is not a tree ensemble")
+    if name == "AdaBoostClassifier" and type(model.estimators_[0]).__name__ != "DecisionTreeClassifier":
+        raise ValueError("Only AdaBoost over decision trees can be compiled")
+    meta, arrays = _tree_arrays(model)
+    return TreeModel(dict(meta, kind="trees"), arrays)
+
+
+def _best_time(function, repeats=3):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def verify(model, features):
+    """
+    Compare a compiled model with the original on `features`.
+
+    Returns a dict with whether the predictions (and XGBoost margins or the
+    sklearn probabilities) are identical, the largest probability difference
+    and the predict time of both.
+    """
+    compiled = compile_model(model)
+    original_seconds, original = _best_time(lambda: model.predict(features))
+    compiled_seconds, predictions = _best_time(lambda: compiled.predict(features))
+    if type(model).__name__ == "XGBClassifier":
+        # XGBoost's softmax rounds differently, so compare the raw margins
+        import xgboost
+
+        reference = model.get_booster().predict(xgboost.DMatrix(features), output_margin=True,
+                                                validate_features=False)
+        scores = compiled.margins(features).reshape(reference.shape)
+    else:
+        reference, scores = model.predict_proba(features), compiled.predict_proba(features)
+    return {
+        "predictions_identical": bool(np.array_equal(original, predictions)),
+        "scores_identical": bool(np.array_equal(reference, scores)),
+        "max_proba_difference": float(np.abs(model.predict_proba(features) - compiled.predict_proba(features)).max()),
+        "original_seconds": original_seconds,
+        "compiled_seconds": compiled_seconds,
+    }
+
+
+def main(argv=None):
+    import warnings
+
+    import joblib
+
+    from dataset import DATA_PATH, load_dataset
+    from feature_encoder import ENCODER
+    from model_registry import MODEL_DIR, MODEL_FILES, TARGETS, model_path
+
+    families = ["random_forest", "bagging", "ada", "xgboost", "decision_tree"]
+    parser = argparse.ArgumentParser(description="Verify compiled tree models against the original pickles.")
+    parser.add_argument("--models", nargs="+", choices=families, default=families)
+    parser.add_argument("--data", default=DATA_PATH, help="CSV the models are compared on (default: final.csv)")
+    parser.add_argument("--model-dir", default=MODEL_DIR, help="directory holding the pickles")
+    args = parser.parse_args(argv)
+
+    features = ENCODER.encode(load_dataset(args.data))
+    model_choices = {prefix: model_choice for model_choice, prefix in MODEL_FILES.items()}
+    print(f"{'model':<16}{'target':<8}{'predictions':>12}{'scores':>10}{'max proba diff':>16}"
+          f"{'original (ms)':>15}{'compiled (ms)':>15}")
+    mismatches = 0
+    for family in args.models:
+        for target in TARGETS:
+            path = model_path(model_choices[family], target, args.model_dir)
+            with warnings.catch_warnings():
+                # Pickles from older library versions and fitted on a DataFrame
+                # warn on load and when fed NumPy rows, as in the app
+                warnings.simplefilter("ignore", UserWarning)
+                try:
+                    model = joblib.load(path)
+                except FileNotFoundError:
+                    print(f"{family:<16}{target:<8}{'missing':>12}")
+                    continue
+                result = verify(model, features)
+            mismatches += not result["predictions_identical"]
+            print(f"{family:<16}{target:<8}{'identical' if result['predictions_identical'] else 'DIFFERENT':>12}"
+                  f"{'identical' if result['scores_identical'] else 'different':>10}"
+                  f"{result['max_proba_difference']:>16.3g}{result['original_seconds'] * 1000:>15.2f}"
+                  f"{result['compiled_seconds'] * 1000:>15.2f}")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
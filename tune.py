@@ -0,0 +1,354 @@
+"""
+Hyperparameter search for the model families trained by run.py.
+
+The search is driven by a JSON config (search_space.json by default) giving,
+for each family, the parameter space and the strategy:
+
+- "halving": successive halving. `n_candidates` parameter sets are sampled
+  from the space and cross-validated on `min_resource` training rows; the
+  best 1/`factor` of them go on to the next rung with `factor` times more
+  rows, until the survivors are scored on the full training folds.
+- "bayesian": `n_trials` parameter sets proposed by optuna's TPE sampler
+  (optuna is only needed for this strategy).
+
+The searches of all families run at the same time and share one pool of
+worker processes, each fold fit taking one core. Every fold result is cached
+on disk, keyed by the family, the parameters, the fold, the number of rows,
+the data file's hash and the library versions, so an interrupted or repeated
+search resumes without refitting anything it already scored. Only the
+training split of run.py is searched; its test split stays unseen.
+
+The score of a parameter set is the mean over the folds and over both targets
+of the configured scorer, since run.py trains a family with the same
+parameters for Y1 and Y2. The winners are written to tuned_params.json, which
+`run.py --params` (or `tune.py --train`) trains with.
+
+Usage:
+    python tune.py                                    # search every family in the config
+    python tune.py --models svm random_forest --workers 4
+    python tune.py --train                            # search, then retrain with the winners
+    python run.py --params tuned_params.json
+"""
+import argparse
+import datetime
+import hashlib
+import json
+import math
+import os
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+import run
+from environment import file_hash, library_versions
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CONFIG_PATH = os.path.join(HERE, 'search_space.json')
+OUTPUT_PATH = os.path.join(HERE, 'tuned_params.json')
+CACHE_DIR = os.path.join(HERE, '.tune_cache')
+
+
+def sample_params(space, rng):
+    """
+    Draw one parameter set from `space`.
+
+    Parameters:
+    - space (dict): Maps parameter names to {"values": [...]} or to
+      {"type": "int" | "float", "low": ..., "high": ..., "log": bool}.
+    - rng (Generator): NumPy random generator.
+    """
+    params = {}
+    for name, dimension in space.items():
+        if 'values' in dimension:
+            params[name] = dimension['values'][rng.integers(len(dimension['values']))]
+            continue
+        low, high = dimension['low'], dimension['high']
+        if dimension.get('log'):
+            value = math.exp(rng.uniform(math.log(low), math.log(high)))
+        else:
+            value = rng.uniform(low, high)
+        params[name] = int(round(value)) if dimension['type'] == 'int' else float(value)
+    return params
+
+
+def suggest_params(trial, space):
+    """Ask an optuna trial for one parameter set from `space`."""
+    params = {}
+    for name, dimension in space.items():
+        if 'values' in dimension:
+            params[name] = trial.suggest_categorical(name, dimension['values'])
+        elif dimension['type'] == 'int':
+            params[name] = trial.suggest_int(name, dimension['low'], dimension['high'], log=dimension.get('log', False))
+        else:
+            params[name] = trial.suggest_float(name, dimension['low'], dimension['high'],
+                                               log=dimension.get('log', False))
+    return params
+
+
+class FoldCache:
+    """
+    Fold results stored as one JSON file per result.
+
+    Parameters:
+    - directory (str): Directory the results are stored in.
+    """
+
+    def __init__(self, directory=CACHE_DIR):
+        self.directory = directory
+
+    @staticmethod
+    def key(**fields):
+        return hashlib.sha256(json.dumps(fields, sort_keys=True).encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f'{key}.json')
+
+    def get(self, key):
+        try:
+            with open(self._path(key)) as result_file:
+                return json.load(result_file)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def put(self, key, result):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename, so an interrupted search never leaves a partial result
+        temporary = f'{path}.{os.getpid()}.tmp'
+        with open(temporary, 'w') as result_file:
+            json.dump(result, result_file)
+        os.replace(temporary, path)
+
+
+_worker_data = {}
+
+
+def _init_worker(data_path, cv, seed):
+    # Load the training split and its folds once per worker process
+    from sklearn.model_selection import KFold
+
+    X, targets = run.load_data(data_path)
+    X_train, _, Y_train, _ = run.split_data(X, run.target_values(targets, run.MULTI_OUTPUT))
+    folds = []
+    for fold, (train, validation) in enumerate(KFold(cv, shuffle=True, random_state=seed).split(X_train)):
+        # Rungs with fewer rows take a prefix of a fixed shuffle of the fold
+        order = np.random.default_rng([seed, fold]).permutation(len(train))
+        folds.append((train[order], validation))
+    _worker_data.update(X=X_train, Y=Y_train, folds=folds, key=(data_path, cv, seed))
+
+
+def evaluate_fold(family, params, fold, n_samples, data_path, cv, seed, scoring):
+    """
+    Fit `family` with `params` on the first `n_samples` rows of a training
+    fold, for each target, and score it on the fold's validation rows.
+
+    Returns a dict with the score of each target and the seconds spent.
+    """
+    from sklearn.metrics import get_scorer
+
+    if _worker_data.get('key') != (data_path, cv, seed):
+        _init_worker(data_path, cv, seed)
+    X, Y = _worker_data['X'], _worker_data['Y']
+    train, validation = _worker_data['folds'][fold]
+    train = train[:n_samples]
+
+    start = time.perf_counter()
+    scorer = get_scorer(scoring)
+    scores = {}
+    for target in Y.columns:
+        model = run.build_model(family, n_jobs=1, params=params)
+        model.fit(X.iloc[train], Y[target].iloc[train])
+        scores[target] = float(scorer(model, X.iloc[validation], Y[target].iloc[validation]))
+    return {'scores': scores, 'seconds': time.perf_counter() - start}
+
+
+class Tuner:
+    """
+    Runs the search of each family, scoring parameter sets on a shared
+    process pool and caching every fold result.
+
+    Parameters:
+    - config (dict): Parsed search config.
+    - data_path (str): CSV the models are trained on.
+    - pool (Executor): Pool the fold fits are submitted to.
+    - cache (FoldCache): Store of the fold results.
+    """
+
+    def __init__(self, config, data_path, pool, cache):
+        self.cv = config.get('cv', 5)
+        self.seed = config.get('seed', 0)
+        self.scoring = config.get('scoring', 'f1_weighted')
+        self.data_path = data_path
+        self.pool = pool
+        self.cache = cache
+        self.data_hash = file_hash(data_path)
+        self.versions = library_versions(('sklearn', 'xgboost'))
+        X, targets = run.load_data(data_path)
+        rows = len(run.split_data(X, targets['y1'])[0])
+        # Rows in the smallest training fold, i.e. the full resource
+        self.full_resource = rows - math.ceil(rows / self.cv)
+
+    def evaluate(self, family, candidates, n_samples):
+        """
+        Cross-validate each parameter set of `candidates` on `n_samples` rows.
+
+        Returns (score, per-target scores) for each candidate, the score
+        being the mean over the folds and targets.
+        """
+        pending = {}
+        results = {}
+        for index, params in enumerate(candidates):
+            for fold in range(self.cv):
+                key = self.cache.key(family=family, params=params, fold=fold, cv=self.cv, seed=self.seed,
+                                     n_samples=n_samples, scoring=self.scoring, data=self.data_hash,
+                                     versions=self.versions)
+                cached = self.cache.get(key)
+                if cached is not None:
+                    results[index, fold] = cached
+                else:
+                    pending[index, fold] = (key, self.pool.submit(
+                        evaluate_fold, family, params, fold, n_samples, self.data_path, self.cv, self.seed,
+                        self.scoring))
+        for (index, fold), (key, future) in pending.items():
+            results[index, fold] = future.result()
+            self.cache.put(key, results[index, fold])
+
+        scored = []
+        for index in range(len(candidates)):
+            fold_scores = [results[index, fold]['scores'] for fold in range(self.cv)]
+            targets = {target: float(np.mean([scores[target] for scores in fold_scores]))
+                       for target in fold_scores[0]}
+            scored.append((float(np.mean(list(targets.values()))), targets))
+        return scored
+
+    def halving(self, family, spec):
+        rng = np.random.default_rng([self.seed, zlib.crc32(family.encode())])
+        candidates = [sample_params(spec['space'], rng) for _ in range(spec.get('n_candidates', 27))]
+        factor = spec.get('factor', 3)
+        resource = spec.get('min_resource', 100)
+        evaluations = 0
+        while True:
+            n_samples = min(resource, self.full_resource)
+            scored = self.evaluate(family, candidates, n_samples)
+            evaluations += len(candidates)
+            ranking = sorted(range(len(candidates)), key=lambda index: scored[index][0], reverse=True)
+            print(f"{family:<16}{len(candidates):>4} candidates on {n_samples:>4} rows, "
+                  f"best {scored[ranking[0]][0]:.4f}", flush=True)
+            if n_samples == self.full_resource:
+                best = ranking[0]
+                return candidates[best], scored[best], evaluations
+            survivors = max(1, math.ceil(len(candidates) / factor))
+            candidates = [candidates[index] for index in ranking[:survivors]]
+            resource *= factor
+
+    def bayesian(self, family, spec):
+        try:
+            import optuna
+        except ImportError:
+            raise ImportError("The bayesian strategy needs optuna: pip install optuna")
+
+        optuna.logging.set_verbosity(optuna.logging.WARNING)
+        study = optuna.create_study(direction='maximize', sampler=optuna.samplers.TPESampler(seed=self.seed))
+        n_trials = spec.get('n_trials', 30)
+        # Trials are proposed a few at a time so their folds run in parallel
+        batch_size = spec.get('batch_size', os.cpu_count() or 1)
+        best = None
+        while len(study.trials) < n_trials:
+            trials = [study.ask() for _ in range(min(batch_size, n_trials - len(study.trials)))]
+            candidates = [suggest_params(trial, spec['space']) for trial in trials]
+            for trial, params, result in zip(trials, candidates,
+                                             self.evaluate(family, candidates, self.full_resource)):
+                study.tell(trial, result[0])
+                if best is None or result[0] > best[1][0]:
+                    best = (params, result)
+            print(f"{family:<16}{len(study.trials):>4} trials, best {best[1][0]:.4f}", flush=True)
+        return best[0], best[1], n_trials
+
+    def tune(self, family, spec):
+        """Search `family` with the strategy of its `spec` and return its result."""
+        start = time.perf_counter()
+        strategy = spec.get('strategy', 'halving')
+        if strategy == 'halving':
+            params, (score, scores), evaluations = self.halving(family, spec)
+        elif strategy == 'bayesian':
+            params, (score, scores), evaluations = self.bayesian(family, spec)
+        else:
+            raise ValueError(f"Unknown search strategy {strategy!r} for {family}")
+        return {
+            'strategy': strategy,
+            'params': params,
+            'score': score,
+            'scores': scores,
+            'evaluations': evaluations,
+            'seconds': time.perf_counter() - start,
+        }
+
+
+def tune_all(config, families=None, workers=None, data_path=run.DATA_PATH, cache_dir=CACHE_DIR):
+    """
+    Search every family of `config` (or only `families`) at the same time.
+
+    Returns the result of each family.
+    """
+    families = [family for family in families or config['families']]
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        tuner = Tuner(config, data_path, pool, FoldCache(cache_dir))
+        # One thread per family drives its search; the fits share the pool
+        with ThreadPoolExecutor(max_workers=len(families)) as searches:
+            futures = {family: searches.submit(tuner.tune, family, config['families'][family])
+                       for family in families}
+            return {family: future.result() for family, future in futures.items()}, tuner.data_hash
+
+
+def write_results(results, data_hash, config_path, output_path=OUTPUT_PATH):
+    """Merge `results` into the tuned parameters file at `output_path`."""
+    tuned = {'families': {}}
+    if os.path.exists(output_path):
+        with open(output_path) as output_file:
+            tuned = json.load(output_file)
+    tuned['families'].update(results)
+    tuned.update(created=datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+                 config=os.path.relpath(config_path, HERE), data_hash=data_hash)
+    temporary = f'{output_path}.tmp'
+    with open(temporary, 'w') as output_file:
+        json.dump(tuned, output_file, indent=2)
+    os.replace(temporary, output_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search the hyperparameters of the run.py model families.")
+    parser.add_argument('--config', default=CONFIG_PATH, help="search config (default: search_space.json)")
+    parser.add_argument('--models', nargs='+', choices=list(run.MODEL_SPECS), help="families to search")
+    parser.add_argument('--workers', type=int, help="worker processes (default: one per CPU core)")
+    parser.add_argument('--data', default=run.DATA_PATH, help="training CSV (default: final.csv)")
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help="directory of the cached fold results")
+    parser.add_argument('--output', default=OUTPUT_PATH, help="tuned parameters file (default: tuned_params.json)")
+    parser.add_argument('--train', action='store_true', help="retrain the searched families with the winners")
+    parser.add_argument('--output-dir', default='.', help="directory the retrained models are saved to")
+    args = parser.parse_args(argv)
+
+    with open(args.config) as config_file:
+        config = json.load(config_file)
+    families = args.models or list(config['families'])
+    unknown = [family for family in families if family not in config['families']]
+    if unknown:
+        parser.error(f"no search space for {', '.join(unknown)} in {args.config}")
+
+    results, data_hash = tune_all(config, families, args.workers, args.data, args.cache_dir)
+    write_results(results, data_hash, args.config, args.output)
+
+    print(f"\n{'model':<16}{'strategy':<10}{'score':>8}  params")
+    for family, result in results.items():
+        print(f"{family:<16}{result['strategy']:<10}{result['score']:>8.4f}  {json.dumps(result['params'])}")
+    print(f"Tuned parameters written to {args.output}")
+
+    if args.train:
+        params = run.load_params(args.output)
+        run.train_all(families, args.workers, args.output_dir, args.data, params=params)
+
+
+if __name__ == '__main__':
+    main()